@@ -40,17 +40,25 @@ def main():
     # 3. 初始化服务层
     from services.settings_service import SettingsService
     from services.history_service import HistoryService
+
+    # 设置服务
+    settings_service = SettingsService()
+
+    # 语义缓存（按设置启用）
+    semantic_cache = None
+    settings = settings_service.get_settings()
+    if settings and settings.chat.enable_semantic_cache:
+        from services.semantic_cache import SemanticCache
+        semantic_cache = SemanticCache(threshold=settings.chat.semantic_cache_threshold)
+        print("✅ 已启用语义缓存")
     
     # 初始化增强版Gemini服务（支持Chat会话连续对话）
     from services.gemini_service_enhanced import GeminiServiceEnhanced
-    gemini_service = GeminiServiceEnhanced(Config.GEMINI_API_KEY)
+    gemini_service = GeminiServiceEnhanced(Config.GEMINI_API_KEY, semantic_cache=semantic_cache)
     print("✅ 使用增强版Gemini服务（支持Chat会话连续对话）")
     
     from services.file_upload_service import get_file_upload_service
 
-    # 设置服务
-    settings_service = SettingsService()
-
     # 历史记录服务
     history_service = HistoryService()
 
@@ -27,6 +27,7 @@ class Config:
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     CHAT_HISTORY_DIR = os.path.join(BASE_DIR, "chat_history")
     CONFIG_DIR = os.path.join(BASE_DIR, "config")
+    LAST_ACTIVE_PATH = os.path.join(CONFIG_DIR, "last_active.json")
     LOGS_DIR = os.path.join(BASE_DIR, "logs")
     
     # 确保目录存在
@@ -39,6 +39,8 @@ class ChatSettings(BaseModel):
     auto_save: bool = True
     save_interval: int = Field(default=5, ge=1, le=60)  # minutes
     enable_streaming: bool = True  # 启用流式回复（默认开启）
+    enable_semantic_cache: bool = False  # 相似提问复用已有回复（默认关闭）
+    semantic_cache_threshold: float = Field(default=0.92, ge=0.0, le=1.0)
 
 
 class StorageSettings(BaseModel):
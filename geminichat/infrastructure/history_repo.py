@@ -3,21 +3,32 @@
 """
 import json
 import os
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 from ..domain.conversation import Conversation
-from ..config.secrets import Config
+
+
+# 同一进程中可能同时存在多个仓储实例，索引的读-改-写需要串行
+_INDEX_LOCK = threading.Lock()
 
 
 class HistoryRepository:
     """历史记录仓储"""
     
+    # 会话索引文件（记录每个会话的摘要，启动时无需逐个解析会话文件）
+    INDEX_FILE = 'chat_index.json'
+    
     # 需要跳过的特殊文件
-    SKIP_FILES = {'folders.json'}
+    SKIP_FILES = {'folders.json', INDEX_FILE}
     
     def __init__(self, history_dir: Optional[str] = None):
-        self.history_dir = Path(history_dir or Config.CHAT_HISTORY_DIR)
+        if history_dir is None:
+            # 配置模块首次导入会读取 .env，只在需要默认目录时才导入
+            from ..config.secrets import Config
+            history_dir = Config.CHAT_HISTORY_DIR
+        self.history_dir = Path(history_dir)
         self._ensure_history_dir()
     
     def _ensure_history_dir(self):
@@ -26,14 +37,117 @@ class HistoryRepository:
     
     def _is_conversation_file(self, file_path: Path) -> bool:
         """判断是否为有效的对话文件"""
-        return file_path.suffix == '.json' and file_path.name not in self.SKIP_FILES
+        return self.is_conversation_name(file_path.name)
+    
+    @classmethod
+    def is_conversation_name(cls, name: str) -> bool:
+        """根据文件名判断是否为有效的对话文件"""
+        return name.endswith('.json') and name not in cls.SKIP_FILES
+    
+    def _load_index(self) -> dict:
+        """从磁盘读取会话索引（id -> 摘要）
+        
+        不在实例中缓存：其他仓储实例可能已经更新了索引，每次都以磁盘内容为准再合并修改
+        """
+        try:
+            with open(self.history_dir / self.INDEX_FILE, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else {}
+        except (json.JSONDecodeError, IOError):
+            return {}
+    
+    def _write_index(self, index: dict):
+        """将会话索引写回磁盘（先写临时文件再替换，读取方不会看到半写的内容）"""
+        index_path = self.history_dir / self.INDEX_FILE
+        tmp_path = index_path.with_name(index_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
+    
+    def update_index(self, data: dict):
+        """更新单个会话在索引中的摘要（会话文件须已写入，用于记录其修改时间）
+        
+        直接写会话文件、不经过 save_conversation 的调用方也需要调用此方法
+        """
+        try:
+            mtime_ns = (self.history_dir / f"{data['id']}.json").stat().st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        
+        with _INDEX_LOCK:
+            index = self._load_index()
+            index[data["id"]] = self._index_entry(data, mtime_ns)
+            self._write_index(index)
+    
+    @staticmethod
+    def _index_entry(data: dict, mtime_ns: Optional[int]) -> dict:
+        """由会话数据生成索引摘要"""
+        return {
+            "updated_at": data.get("updated_at", ""),
+            "is_ephemeral": data.get("is_ephemeral", False),
+            "has_messages": bool(data.get("messages")),
+            "mtime_ns": mtime_ns
+        }
+    
+    def refresh_index(self) -> dict:
+        """按目录中的会话文件校正索引并返回（id -> 摘要）
+        
+        文件已不存在的条目直接删除；索引中缺失或修改时间不一致的文件重新解析摘要，
+        其余条目沿用。索引有变化时写回磁盘，下次启动只需读取索引
+        """
+        file_mtimes = {}
+        with os.scandir(self.history_dir) as entries:
+            for entry in entries:
+                if not self.is_conversation_name(entry.name):
+                    continue
+                try:
+                    if entry.is_file():
+                        file_mtimes[entry.name[:-len('.json')]] = entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+        
+        with _INDEX_LOCK:
+            index = self._load_index()
+            orphans = [chat_id for chat_id in index if chat_id not in file_mtimes]
+            for chat_id in orphans:
+                del index[chat_id]
+            changed = bool(orphans)
+            
+            for chat_id, mtime_ns in file_mtimes.items():
+                entry = index.get(chat_id)
+                if isinstance(entry, dict) and entry.get("mtime_ns") == mtime_ns:
+                    continue
+                try:
+                    with open(self.history_dir / f"{chat_id}.json", 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (json.JSONDecodeError, IOError, UnicodeDecodeError):
+                    data = None
+                # 无法解析的文件也记录修改时间，不会被当作最近会话，文件未变化时不再重复解析
+                index[chat_id] = self._index_entry(data if isinstance(data, dict) else {}, mtime_ns)
+                changed = True
+            
+            if changed:
+                self._write_index(index)
+        return index
+    
+    def _remove_from_index(self, conversation_id: str):
+        """从索引中移除会话"""
+        with _INDEX_LOCK:
+            index = self._load_index()
+            if index.pop(conversation_id, None) is not None:
+                self._write_index(index)
     
     def save_conversation(self, conversation: Conversation) -> bool:
         """保存会话"""
         try:
             file_path = self.history_dir / f"{conversation.id}.json"
+            data = conversation.to_dict()
             with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(conversation.to_dict(), f, ensure_ascii=False, indent=2)
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.update_index(data)
             return True
         except IOError:
             return False
@@ -85,6 +199,7 @@ class HistoryRepository:
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
             
+            self.update_index(data)
             return True
         except (json.JSONDecodeError, IOError):
             return False
@@ -95,6 +210,7 @@ class HistoryRepository:
         try:
             if file_path.exists():
                 file_path.unlink()
+            self._remove_from_index(conversation_id)
             return True
         except OSError:
             return False
@@ -3,12 +3,26 @@ Gemini API 客户端 - 增强版，支持Chat会话连续对话
 """
 import asyncio
 import os
-from typing import Optional, AsyncIterator, List, Dict, Any
+from typing import Optional, AsyncIterator, Callable, Iterator, List, Dict, Any
 
 from ...domain.model_type import ModelType
 from ...config.secrets import Config
 
 
+_STREAM_END = object()
+
+
+async def _iterate_in_thread(make_iterator: Callable[[], Iterator[Any]]) -> AsyncIterator[Any]:
+    """在线程池中创建并逐步推进同步迭代器（SDK的流式接口会阻塞等待网络），
+    事件循环线程由多个标签页和附件处理共享，不能被单个请求占住"""
+    iterator = await asyncio.to_thread(lambda: iter(make_iterator()))
+    while True:
+        item = await asyncio.to_thread(next, iterator, _STREAM_END)
+        if item is _STREAM_END:
+            return
+        yield item
+
+
 class GeminiClientEnhanced:
     """Gemini API 客户端 - 增强版，基于最新Google GenAI SDK，支持Chat会话连续对话"""
     
@@ -20,6 +34,7 @@ class GeminiClientEnhanced:
         self.client = None
         self.current_model_name: Optional[str] = None
         self._chat_sessions: Dict[str, Any] = {}  # 存储Chat会话对象
+        self._chat_session_models: Dict[str, str] = {}  # 官方Chat会话ID -> 创建时使用的模型，清空历史时复用
         self._connection_tested = False  # 标记是否已测试连接
         
         # 导入和初始化最新的Google GenAI SDK
@@ -105,6 +120,7 @@ class GeminiClientEnhanced:
                     model=model_name
                 )
                 self._chat_sessions[session_id] = chat_session
+                self._chat_session_models[session_id] = model_name
                 print(f"✅ 创建官方Chat会话成功: {session_id}")
                 return chat_session
                 
@@ -147,8 +163,27 @@ class GeminiClientEnhanced:
         """删除Chat会话对象"""
         if session_id in self._chat_sessions:
             del self._chat_sessions[session_id]
+            self._chat_session_models.pop(session_id, None)
             print(f"✅ 删除Chat会话: {session_id}")
     
+    def reset_chat_session(self, session_id: str) -> None:
+        """清空Chat会话的历史记录，会话ID及其配置保持不变
+        
+        手动维护上下文的会话原地清空；官方Chat会话对象没有公开的清空接口，
+        按创建时的模型以空历史重建并替换原对象（只构造本地对象，不发起请求）
+        """
+        chat_session = self._chat_sessions.get(session_id)
+        if chat_session is None:
+            return
+        
+        if isinstance(chat_session, dict):
+            chat_session["messages"].clear()
+        else:
+            self._chat_sessions[session_id] = self.client.chats.create(
+                model=self._chat_session_models[session_id],
+                history=[]
+            )
+    
     def count_tokens_for_session(self, session_id: str, message: str) -> int:
         """计算指定会话和消息的token数量"""
         try:
@@ -170,9 +205,16 @@ class GeminiClientEnhanced:
         session_id: str,
         model_name: Optional[str] = None,
         system_instruction: Optional[str] = None,
+        reset_before: bool = False,
         **kwargs
     ) -> str:
-        """使用Chat会话进行连续对话（非流式）- 官方推荐方式"""
+        """使用Chat会话进行连续对话（非流式）- 官方推荐方式
+        
+        reset_before 为 True 时先清空该会话的历史，用于复用单轮对话会话
+        """
+        if reset_before:
+            self.reset_chat_session(session_id)
+        
         if model_name is None:
             model_name = self.current_model_name or "gemini-2.0-flash-001"
         elif hasattr(model_name, 'value') and not isinstance(model_name, str):
@@ -195,7 +237,7 @@ class GeminiClientEnhanced:
                 # 检查是否是官方Chat会话对象
                 if hasattr(chat_session, 'send_message'):
                     # 使用官方Chat会话API - 上下文自动管理
-                    response = chat_session.send_message(message)
+                    response = await asyncio.to_thread(chat_session.send_message, message)
                     result = response.text if hasattr(response, 'text') and response.text else "空回复"
                     print(f"收到官方Chat会话响应: {result[:100]}...")
                     return result
@@ -272,10 +314,9 @@ class GeminiClientEnhanced:
             if hasattr(chat_session, 'send_message_stream'):
                 # 使用官方Chat会话流式API - 上下文自动管理
                 print("使用官方流式Chat API")
-                for chunk in chat_session.send_message_stream(message):
+                async for chunk in _iterate_in_thread(lambda: chat_session.send_message_stream(message)):
                     if hasattr(chunk, 'text') and chunk.text:
                         yield chunk.text
-                    await asyncio.sleep(0.01)
             else:
                 # 使用手动维护的上下文进行流式调用
                 if isinstance(chat_session, dict):
@@ -330,7 +371,8 @@ class GeminiClientEnhanced:
                 last_user_message = user_messages[-1]["content"]
                 
                 print(f"尝试API调用 (第 {attempt + 1} 次)...")
-                response = self.client.models.generate_content(
+                response = await asyncio.to_thread(
+                    self.client.models.generate_content,
                     model=model_name,
                     contents=last_user_message
                 )
@@ -376,17 +418,14 @@ class GeminiClientEnhanced:
                 last_user_message = user_messages[-1]["content"]
                 
                 print(f"尝试流式API调用 (第 {attempt + 1} 次)...")
-                stream_response = self.client.models.generate_content_stream(
+                chunk_count = 0
+                async for chunk in _iterate_in_thread(lambda: self.client.models.generate_content_stream(
                     model=model_name,
                     contents=last_user_message
-                )
-                
-                chunk_count = 0
-                for chunk in stream_response:
+                )):
                     chunk_count += 1
                     if hasattr(chunk, 'text') and chunk.text:
                         yield chunk.text
-                    await asyncio.sleep(0.01)
                     
                 print(f"流式响应完成，共收到 {chunk_count} 个块")
                 return  # 成功完成，退出重试循环
@@ -11,8 +11,11 @@ import hashlib
 from pathlib import Path
 from typing import List, Dict, Optional, Any, Tuple, Union
 from datetime import datetime
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse, urljoin, urlsplit, urlunsplit
 import asyncio
+import logging
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass, asdict
 
 try:
@@ -27,6 +30,8 @@ except ImportError as e:
 
 from geminichat.domain.attachment import Attachment, AttachmentType
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class UploadLimits:
@@ -35,11 +40,15 @@ class UploadLimits:
     max_total_size: int = 200 * 1024 * 1024  # 200MB
     max_file_count: int = 100
     max_request_size: int = 20 * 1024 * 1024  # 20MB (使用File API的阈值)
+    # 小文件不单独上传File API，随对话请求内联发送
+    max_inline_file_size: int = 1 * 1024 * 1024  # 1MB
+    max_inline_batch_size: int = 5 * 1024 * 1024  # 每次请求内联总大小 5MB
+    max_inline_batch_count: int = 50  # 每次请求内联文件数
 
 
-@dataclass 
+@dataclass(slots=True)
 class URLInfo:
-    """URL信息"""
+    """URL信息（一次分析可能产生数千个实例，使用 __slots__ 省去实例字典）"""
     url: str
     url_type: str  # 'pdf', 'image', 'video', 'audio', 'youtube', 'html'
     estimated_size: Optional[int] = None
@@ -101,11 +110,26 @@ class FileUploadService:
         'audio/flac': AttachmentType.AUDIO,
     }
     
+    # 分析URL时同时进行的 HEAD 请求数上限
+    URL_PROBE_CONCURRENCY = 16
+    # 缓存的URL探测结果数上限
+    URL_PROBE_CACHE_SIZE = 4096
+    # 同时处理（哈希/上传/下载）的文件或URL数上限
+    PROCESS_CONCURRENCY = 8
+    
     def __init__(self, api_key: Optional[str] = None, upload_limits: Optional[UploadLimits] = None):
         """初始化文件上传服务"""
         self.api_key = api_key
         self.limits = upload_limits or UploadLimits()
         self.client = None
+        # 附件组合 -> Gemini内容部分（LRU），同一组附件连续提问时不再重新读取文件
+        # 发送在共享事件循环线程中构建，清空由界面线程触发，读写需加锁
+        self._parts_cache: "OrderedDict[tuple, List[Any]]" = OrderedDict()
+        self._parts_cache_lock = threading.Lock()
+        # 规范化URL -> (预估大小, MIME类型)（LRU），重复分析同一URL时不再发请求
+        # 分析任务可能在多个线程池线程中同时运行，读写需加锁
+        self._url_probe_cache: "OrderedDict[str, Tuple[Optional[int], Optional[str]]]" = OrderedDict()
+        self._url_probe_lock = threading.Lock()
         
         # 初始化Gemini客户端
         if api_key and genai:
@@ -165,50 +189,107 @@ class FileUploadService:
     def analyze_urls(self, urls: List[str]) -> List[URLInfo]:
         """
         分析URL列表，识别类型和预估大小
+        在没有事件循环的工作线程中调用，内部并发探测所有URL
+        """
+        return asyncio.run(self.analyze_urls_async(urls))
+    
+    async def analyze_urls_async(self, urls: List[str]) -> List[URLInfo]:
+        """
+        分析URL列表，识别类型和预估大小（异步版本）
+        HEAD 请求并发发出，同时进行的请求数不超过 URL_PROBE_CONCURRENCY
         """
         url_infos = []
+        seen_urls = set()  # 已加入的规范化URL，重复的URL只分析一次
         
         for url in urls:
-            url = url.strip()
+            url = self.normalize_url(url)
             if not url:
                 continue
             
-            # 确保URL有协议前缀
-            if not url.startswith(('http://', 'https://')):
-                url = 'https://' + url
-            
             try:
-                parsed = urlparse(url)
-                if not parsed.netloc:
+                canonical_url = self.canonicalize_url(url)
+                if canonical_url in seen_urls:
                     continue
+                seen_urls.add(canonical_url)
                 
                 url_type = self._detect_url_type(url)
-                url_info = URLInfo(
+                url_infos.append(URLInfo(
                     url=url,
                     url_type=url_type,
                     title=self._extract_title_from_url(url)
-                )
-                
-                # 尝试获取内容大小和MIME类型
-                if httpx:
-                    try:
-                        head_response = httpx.head(url, timeout=5.0)
-                        if head_response.status_code == 200:
-                            content_length = head_response.headers.get('content-length')
-                            if content_length:
-                                url_info.estimated_size = int(content_length)
-                            url_info.mime_type = head_response.headers.get('content-type', '').split(';')[0]
-                    except:
-                        pass
-                
-                url_infos.append(url_info)
+                ))
                 
             except Exception as e:
                 print(f"URL分析失败 {url}: {e}")
                 continue
         
+        # 尝试获取内容大小和MIME类型
+        if httpx and url_infos:
+            semaphore = asyncio.Semaphore(self.URL_PROBE_CONCURRENCY)
+            limits = httpx.Limits(max_connections=self.URL_PROBE_CONCURRENCY)
+            async with httpx.AsyncClient(timeout=5.0, limits=limits) as client:
+                # 单个URL失败或超时不影响其他URL
+                await asyncio.gather(
+                    *(self._probe_url(client, semaphore, url_info) for url_info in url_infos),
+                    return_exceptions=True
+                )
+        
         return url_infos
     
+    async def _probe_url(self, client, semaphore: asyncio.Semaphore, url_info: URLInfo) -> None:
+        """发送 HEAD 请求，把内容大小和MIME类型填入 url_info（优先使用缓存的结果）"""
+        key = self.canonicalize_url(url_info.url)
+        with self._url_probe_lock:
+            cached = self._url_probe_cache.get(key)
+            if cached is not None:
+                self._url_probe_cache.move_to_end(key)
+        
+        if cached is None:
+            async with semaphore:
+                head_response = await client.head(url_info.url)
+            # 只有返回200时才缓存；网络错误和非200状态（405、429、5xx等）可能是暂时的，下次分析会重试
+            if head_response.status_code != 200:
+                return
+            content_length = head_response.headers.get('content-length')
+            cached = (
+                int(content_length) if content_length else None,
+                head_response.headers.get('content-type', '').split(';')[0]
+            )
+            with self._url_probe_lock:
+                self._url_probe_cache[key] = cached
+                if len(self._url_probe_cache) > self.URL_PROBE_CACHE_SIZE:
+                    self._url_probe_cache.popitem(last=False)
+        
+        estimated_size, mime_type = cached
+        if estimated_size is not None:
+            url_info.estimated_size = estimated_size
+        if mime_type is not None:
+            url_info.mime_type = mime_type
+    
+    @staticmethod
+    def normalize_url(url: str) -> Optional[str]:
+        """补全URL的协议前缀（与分析结果中的 url 一致），不是有效URL时返回 None"""
+        url = url.strip()
+        if not url:
+            return None
+        
+        # 确保URL有协议前缀
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        
+        try:
+            if not urlparse(url).netloc:
+                return None
+        except ValueError:
+            return None
+        return url
+    
+    @staticmethod
+    def canonicalize_url(url: str) -> str:
+        """规范化URL用作去重和缓存键：协议和主机名转为小写，去掉片段"""
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+    
     def _detect_url_type(self, url: str) -> str:
         """检测URL类型"""
         url_lower = url.lower()
@@ -247,22 +328,49 @@ class FileUploadService:
     async def process_files(self, file_paths: List[str]) -> List[ProcessedFile]:
         """
         处理文件列表，上传到Gemini File API或准备内联数据
+        各文件并发处理，同时进行的不超过 PROCESS_CONCURRENCY 个，结果保持原顺序
         """
-        processed_files = []
+        semaphore = asyncio.Semaphore(self.PROCESS_CONCURRENCY)
+        inline_paths = self._select_inline_files(file_paths)
+        
+        async def process(file_path: str) -> Optional[ProcessedFile]:
+            async with semaphore:
+                try:
+                    return await self._process_single_file(file_path, inline=file_path in inline_paths)
+                except Exception as e:
+                    print(f"处理文件失败 {file_path}: {e}")
+                    return None
         
+        results = await asyncio.gather(*(process(file_path) for file_path in file_paths))
+        return [processed_file for processed_file in results if processed_file]
+    
+    def _select_inline_files(self, file_paths: List[str]) -> set:
+        """
+        选出随对话请求内联发送的小文件
+        按顺序累计，直到达到内联的总大小或文件数上限；其余文件照常上传File API。
+        多批文件可能一起发送，实际发送前由 upload_over_inline_budget 再按整次请求检查预算
+        """
+        inline_paths = set()
+        total_size = 0
         for file_path in file_paths:
+            if len(inline_paths) >= self.limits.max_inline_batch_count:
+                break
+            # 不支持的格式不会被处理，不占用内联预算
+            mime_type, _ = mimetypes.guess_type(file_path)
+            if mime_type not in self.SUPPORTED_FORMATS:
+                continue
             try:
-                processed_file = await self._process_single_file(file_path)
-                if processed_file:
-                    processed_files.append(processed_file)
-            except Exception as e:
-                print(f"处理文件失败 {file_path}: {e}")
+                file_size = os.path.getsize(file_path)
+            except OSError:
                 continue
-        
-        return processed_files
+            if (file_size <= self.limits.max_inline_file_size
+                    and total_size + file_size <= self.limits.max_inline_batch_size):
+                inline_paths.add(file_path)
+                total_size += file_size
+        return inline_paths
     
-    async def _process_single_file(self, file_path: str) -> Optional[ProcessedFile]:
-        """处理单个文件"""
+    async def _process_single_file(self, file_path: str, inline: bool = False) -> Optional[ProcessedFile]:
+        """处理单个文件，inline 为 True 时不上传File API（内容随请求内联发送）"""
         path = Path(file_path)
         
         if not path.exists() or not path.is_file():
@@ -277,8 +385,9 @@ class FileUploadService:
         
         attachment_type = self.SUPPORTED_FORMATS[mime_type]
         
-        # 计算文件哈希
-        content_hash = self._calculate_file_hash(file_path)
+        # 计算文件哈希（在线程池中读取，不阻塞其他文件的处理）
+        loop = asyncio.get_event_loop()
+        content_hash = await loop.run_in_executor(None, self._calculate_file_hash, file_path)
         
         # 创建处理后的文件对象
         processed_file = ProcessedFile(
@@ -291,7 +400,7 @@ class FileUploadService:
         )
         
         # 决定是否使用File API
-        if file_size > self.limits.max_request_size or self.client:
+        if not inline and (file_size > self.limits.max_request_size or self.client):
             # 使用File API上传
             if self.client:
                 try:
@@ -327,23 +436,20 @@ class FileUploadService:
         return uploaded_file
     
     async def process_urls(self, urls: List[str]) -> List[ProcessedFile]:
-        """处理URL列表，下载并处理内容"""
-        processed_files = []
+        """处理URL列表，下载并处理内容（并发下载，结果保持原顺序）"""
+        semaphore = asyncio.Semaphore(self.PROCESS_CONCURRENCY)
         
-        for url in urls:
-            try:
-                url = url.strip()
-                if not url:
-                    continue
-                
-                processed_file = await self._process_single_url(url)
-                if processed_file:
-                    processed_files.append(processed_file)
-            except Exception as e:
-                print(f"处理URL失败 {url}: {e}")
-                continue
+        async def process(url: str) -> Optional[ProcessedFile]:
+            async with semaphore:
+                try:
+                    return await self._process_single_url(url)
+                except Exception as e:
+                    print(f"处理URL失败 {url}: {e}")
+                    return None
         
-        return processed_files
+        urls = [url.strip() for url in urls if url.strip()]
+        results = await asyncio.gather(*(process(url) for url in urls))
+        return [processed_file for processed_file in results if processed_file]
     
     async def _process_single_url(self, url: str) -> Optional[ProcessedFile]:
         """处理单个URL"""
@@ -486,8 +592,78 @@ class FileUploadService:
         except Exception:
             return ""
     
+    PARTS_CACHE_SIZE = 4
+    
+    def create_gemini_parts_cached(self, processed_files: List[ProcessedFile]) -> List[Any]:
+        """带缓存的 create_gemini_parts，按附件的内容哈希/路径/类型组合缓存
+        
+        构建本身不会改变上传状态（File API上传已在 upload_over_inline_budget 中完成），
+        因此同一组附件再次发送时键保持不变
+        """
+        key = tuple(
+            (f.file_path, f.content_hash, f.mime_type, f.gemini_file is not None)
+            for f in processed_files
+        )
+        with self._parts_cache_lock:
+            parts = self._parts_cache.get(key)
+            if parts is not None:
+                self._parts_cache.move_to_end(key)
+                return parts
+        
+        parts = self.create_gemini_parts(processed_files)
+        with self._parts_cache_lock:
+            self._parts_cache[key] = parts
+            if len(self._parts_cache) > self.PARTS_CACHE_SIZE:
+                self._parts_cache.popitem(last=False)
+        return parts
+    
+    def clear_parts_cache(self):
+        """清空内容部分缓存（释放内联文件数据）"""
+        with self._parts_cache_lock:
+            self._parts_cache.clear()
+    
+    async def upload_over_inline_budget(self, processed_files: List[ProcessedFile]) -> None:
+        """
+        按整次请求检查内联预算，超出内联总大小或文件数上限的文件改为上传File API
+        多批文件可能一起发送，需在创建内容部分之前调用；上传在线程池中并发执行，
+        结果记录在 ProcessedFile 上，再次发送时直接引用
+        """
+        if not self.client:
+            return
+        
+        inline_size = 0
+        inline_count = 0
+        over_budget = []
+        for processed_file in processed_files:
+            if processed_file.gemini_file or (processed_file.metadata and processed_file.metadata.get('is_youtube')):
+                continue
+            if (inline_count < self.limits.max_inline_batch_count
+                    and inline_size + processed_file.file_size <= self.limits.max_inline_batch_size):
+                inline_size += processed_file.file_size
+                inline_count += 1
+            else:
+                over_budget.append(processed_file)
+        
+        if not over_budget:
+            return
+        
+        semaphore = asyncio.Semaphore(self.PROCESS_CONCURRENCY)
+        
+        async def upload(processed_file: ProcessedFile):
+            async with semaphore:
+                try:
+                    processed_file.gemini_file = await self._upload_to_file_api(
+                        processed_file.file_path, processed_file.mime_type
+                    )
+                    logger.info("超出内联预算，文件已上传到File API: %s", processed_file.original_name)
+                except Exception as e:
+                    # 上传失败时仍按内联发送
+                    logger.warning("File API上传失败 %s: %s", processed_file.original_name, e)
+        
+        await asyncio.gather(*(upload(processed_file) for processed_file in over_budget))
+    
     def create_gemini_parts(self, processed_files: List[ProcessedFile]) -> List[Any]:
-        """为Gemini API创建内容部分"""
+        """为Gemini API创建内容部分（内联预算由 upload_over_inline_budget 预先处理）"""
         if not types:
             return []
         
@@ -535,29 +711,19 @@ def get_file_upload_service(api_key: Optional[str] = None) -> FileUploadService:
     return FileUploadService(api_key)
 
 
+# URL 文本解析用的正则，导入时编译一次（输入框每次按键都会调用解析）
+_URL_SEP_RE = re.compile(r'[,，\s]+')  # 空白（含换行）、逗号、中文逗号
+_URL_SCHEME_RE = re.compile(r'https?://')
+
+
 def parse_urls_from_text(text: str) -> List[str]:
     """从文本中解析URL列表"""
-    if not text.strip():
-        return []
-    
     urls = []
     
-    # 按换行符分割
-    lines = text.split('\n')
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # 按空格、逗号、中文逗号分割
-        parts = re.split(r'[,，\s]+', line)
-        for part in parts:
-            part = part.strip()
-            if not part:
-                continue
-            
-            # 检查是否包含URL模式
-            if re.match(r'^https?://', part) or '.' in part:
-                urls.append(part)
+    # 按空白、逗号、中文逗号分割，分隔符已包含换行
+    for part in _URL_SEP_RE.split(text):
+        # 检查是否包含URL模式
+        if part and (_URL_SCHEME_RE.match(part) or '.' in part):
+            urls.append(part)
     
     return urls
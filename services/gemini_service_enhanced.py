@@ -2,9 +2,11 @@
 Gemini 服务层 - 增强版，支持Chat会话连续对话
 """
 import asyncio
+import secrets
+import threading
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, TYPE_CHECKING
 import sys
 import os
 
@@ -19,12 +21,23 @@ try:
 except ImportError as e:
     print(f"Import warning in gemini_service_enhanced: {e}")
 
+if TYPE_CHECKING:
+    from services.semantic_cache import SemanticCache
+
+
+# 错误回复的固定前缀
+_ERR_PREFIX = "抱歉，发生了错误："
+
 
 class GeminiServiceEnhanced:
     """Gemini 聊天服务 - 增强版，支持Chat会话连续对话"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, semantic_cache: Optional['SemanticCache'] = None):
         self.api_key = api_key
+        # 单轮生成复用的会话（按模型区分），避免每次调用都创建和销毁会话对象
+        self._oneshot_session_prefix = f"oneshot-{secrets.token_hex(4)}"
+        self._oneshot_session_id: Optional[str] = None
+        self._oneshot_lock = threading.Lock()  # 清空历史与发送须作为整体执行，防止并发调用共用同一会话
         try:
             self.client = GeminiClientEnhanced(api_key) if api_key else GeminiClientEnhanced()
             self.history_repo = HistoryRepository()
@@ -33,19 +46,22 @@ class GeminiServiceEnhanced:
             print(f"Warning: GeminiServiceEnhanced initialization failed: {e}")
             self.client = None
             self.history_repo = None
+        
+        # 可选的语义缓存：同一会话内的相似提问直接复用已有回复
+        self._sem_cache = semantic_cache
+        if self._sem_cache is not None and self._sem_cache.client is None:
+            self._sem_cache.client = self.client
     
     def _ensure_domain_conversation(self, conversation):
         """确保转换为域模型的Conversation对象"""
         if conversation is None:
-            from geminichat.domain.conversation import Conversation
             return Conversation()
             
         # 如果已经是域模型对象，直接返回
-        if hasattr(conversation, '__module__') and 'domain' in str(conversation.__module__):
+        if isinstance(conversation, Conversation):
             return conversation
             
         # 如果是简化对象，转换为域模型对象
-        from geminichat.domain.conversation import Conversation
         domain_conversation = Conversation(
             id=getattr(conversation, 'id', str(uuid.uuid4())),
             title=getattr(conversation, 'title', '新聊天')
@@ -112,6 +128,31 @@ class GeminiServiceEnhanced:
         # 添加到会话
         conversation.add_message(user_message)
         
+        # 语义缓存查找，命中时跳过Gemini调用
+        cache_embedding = None
+        if self._sem_cache is not None and self._sem_cache.enabled:
+            try:
+                cache_embedding = await self._sem_cache.embed(content)
+                hit = self._sem_cache.lookup(conversation.id, cache_embedding)
+            except Exception as e:
+                print(f"语义缓存查询失败: {e}")
+                cache_embedding = None
+                hit = None
+            
+            if hit is not None:
+                assistant_message = Message(
+                    id=str(uuid.uuid4()),
+                    role=MessageRole.ASSISTANT,
+                    content=hit.response,
+                    timestamp=datetime.now(),
+                    message_type=MessageType.TEXT,
+                    metadata={"cache_hit": True, "similarity": hit.similarity}
+                )
+                conversation.add_message(assistant_message)
+                if self.history_repo:
+                    self.history_repo.save_conversation(conversation)
+                return assistant_message, conversation
+        
         try:
             if streaming:
                 # 流式处理
@@ -145,6 +186,10 @@ class GeminiServiceEnhanced:
             # 添加到会话
             conversation.add_message(assistant_message)
             
+            # 写入语义缓存
+            if cache_embedding is not None and not response_text.startswith(_ERR_PREFIX):
+                self._sem_cache.store(conversation.id, cache_embedding, response_text)
+            
             # 保存会话
             if self.history_repo:
                 self.history_repo.save_conversation(conversation)
@@ -156,7 +201,7 @@ class GeminiServiceEnhanced:
             error_message = Message(
                 id=str(uuid.uuid4()),
                 role=MessageRole.ASSISTANT,
-                content=f"抱歉，发生了错误：{str(e)}",
+                content=_ERR_PREFIX + str(e),
                 timestamp=datetime.now(),
                 message_type=MessageType.TEXT,
                 metadata={"error": True}
@@ -196,6 +241,7 @@ class GeminiServiceEnhanced:
         # 添加到会话
         conversation.add_message(user_message)
         
+        conv_ref = conversation
         try:
             assistant_content = ""
             async for chunk in self.client.chat_with_session_stream_async(
@@ -205,7 +251,7 @@ class GeminiServiceEnhanced:
                 system_instruction=system_instruction
             ):
                 assistant_content += chunk
-                yield chunk, conversation
+                yield chunk, conv_ref
             
             # 创建最终的助手消息
             assistant_message = Message(
@@ -224,8 +270,7 @@ class GeminiServiceEnhanced:
                 self.history_repo.save_conversation(conversation)
             
         except Exception as e:
-            error_text = f"抱歉，发生了错误：{str(e)}"
-            yield error_text, conversation
+            yield _ERR_PREFIX + str(e), conv_ref
     
     def get_available_models(self) -> List[str]:
         """获取可用模型列表"""
@@ -242,26 +287,38 @@ class GeminiServiceEnhanced:
     
     def clear_conversation_context(self, conversation_id: str) -> None:
         """清除指定会话的Chat上下文"""
+        if self._sem_cache is not None:
+            self._sem_cache.invalidate(conversation_id)
         if self.client:
             self.client.remove_chat_session(conversation_id)
             print(f"✅ 已清除会话 {conversation_id} 的上下文")
     
     def clear_all_contexts(self) -> None:
         """清除所有Chat会话上下文"""
+        if self._sem_cache is not None:
+            self._sem_cache.clear()
         if self.client:
             self.client.clear_all_sessions()
             print("✅ 已清除所有会话上下文")
     
-    def get_context_info(self) -> Dict[str, Any]:
-        """获取当前上下文信息"""
+    def get_context_info(self, detail: bool = False) -> Dict[str, Any]:
+        """获取当前上下文信息
+        
+        默认只返回会话数量和ID；detail 为 True 时附带完整的会话对象
+        """
         if self.client:
             sessions = self.client.get_chat_sessions()
-            return {
+            info = {
                 "total_sessions": len(sessions),
-                "session_ids": list(sessions.keys()),
-                "sessions": sessions
+                "session_ids": tuple(sessions)
             }
-        return {"total_sessions": 0, "session_ids": [], "sessions": {}}
+            if detail:
+                info["sessions"] = sessions
+            return info
+        info = {"total_sessions": 0, "session_ids": ()}
+        if detail:
+            info["sessions"] = {}
+        return info
     
     def estimate_tokens(self, conversation_id: str, message: str) -> int:
         """估算消息的token数量"""
@@ -283,15 +340,24 @@ class GeminiServiceEnhanced:
         """生成内容的同步方法"""
         if self.client:
             try:
-                # 创建临时会话ID
-                temp_session_id = f"temp_{uuid.uuid4().hex[:8]}"
-                response = asyncio.run(self.client.chat_with_session_async(
-                    message=prompt,
-                    session_id=temp_session_id
-                ))
-                # 清理临时会话
-                self.client.remove_chat_session(temp_session_id)
-                return response
+                with self._oneshot_lock:
+                    model_name = self.client.current_model_name or "gemini-2.0-flash-001"
+                    # 复用当前模型的单轮会话，发送前清空其历史
+                    return asyncio.run(self.client.chat_with_session_async(
+                        message=prompt,
+                        session_id=self._get_oneshot_session_id(model_name),
+                        model_name=model_name,
+                        reset_before=True
+                    ))
             except Exception as e:
                 return f"生成内容时出错: {e}"
         return "服务未初始化"
+    
+    def _get_oneshot_session_id(self, model_name: str) -> str:
+        """获取指定模型的单轮会话ID，模型变化时释放旧模型的会话"""
+        session_id = f"{self._oneshot_session_prefix}-{model_name}"
+        if self._oneshot_session_id != session_id:
+            if self._oneshot_session_id is not None:
+                self.client.remove_chat_session(self._oneshot_session_id)
+            self._oneshot_session_id = session_id
+        return session_id
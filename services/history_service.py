@@ -50,6 +50,9 @@ class HistoryService:
             with open(path, "w", encoding="utf-8") as f:
                 data = {"schema_version": 1, **conv.to_dict()}
                 json.dump(data, f, ensure_ascii=False, indent=2)
+            # 直接写文件时同样要维护会话索引，否则启动时会读到过期的索引
+            if self.repository:
+                self.repository.update_index(data)
         elif self.repository:
             self.repository.save_conversation(conv)
     
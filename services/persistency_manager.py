@@ -1,7 +1,8 @@
 # services/persistency_manager.py
 # 持久化策略管理器
 
-from typing import Optional, TYPE_CHECKING
+from typing import Dict, FrozenSet, Iterator, Optional, TYPE_CHECKING
+import json
 import logging
 
 if TYPE_CHECKING:
@@ -15,6 +16,7 @@ class PersistencyManager:
     
     def __init__(self, history_service):
         self.history_service = history_service
+        self._hashes: Dict[str, int] = {}  # 会话ID -> 上次保存时的内容指纹
     
     def ensure_persistency_if_content(self, chat: 'Conversation') -> bool:
         """
@@ -125,11 +127,27 @@ class PersistencyManager:
                     self._save_chat(chat)
                     logger.info(f"退出时保存会话: {getattr(chat, 'id', 'unknown')}")
     
+    @staticmethod
+    def _content_hash(chat: 'Conversation') -> Optional[int]:
+        """计算会话内容指纹，用于跳过未变更会话的重复保存
+        
+        基于 to_dict() 的序列化结果，标题、元数据以及消息的原地修改都会改变指纹；
+        没有 to_dict() 的会话对象返回None（总是保存）
+        """
+        to_dict = getattr(chat, 'to_dict', None)
+        if to_dict is None:
+            return None
+        return hash(json.dumps(to_dict(), sort_keys=True, ensure_ascii=False, default=str))
+    
     def _save_chat(self, chat: 'Conversation'):
-        """保存会话到存储"""
+        """保存会话到存储（内容未变更时跳过）"""
         try:
             if self.history_service:
+                h = self._content_hash(chat)
+                if h is not None and self._hashes.get(chat.id) == h:
+                    return
                 self.history_service.save(chat)
+                self._hashes[chat.id] = h
         except Exception as e:
             logger.error(f"保存会话失败 {chat.id}: {e}")
     
@@ -137,6 +155,8 @@ class PersistencyManager:
         """丢弃会话（从存储中删除，如果已存在）"""
         try:
             chat_id = getattr(chat, 'id', None)
+            if chat_id:
+                self._hashes.pop(chat_id, None)
             if chat_id and self.history_service and hasattr(self.history_service, 'delete'):
                 self.history_service.delete(chat_id)
             # 如果没有delete方法，空的临时会话本来就不会被保存，所以不需要额外操作
@@ -162,6 +182,15 @@ class EphemeralChatTracker:
         """检查是否为被跟踪的临时会话"""
         return chat_id in self.ephemeral_chats
     
-    def get_all_ephemeral(self) -> set:
-        """获取所有临时会话ID"""
-        return self.ephemeral_chats.copy()
+    def get_all_ephemeral(self) -> FrozenSet[str]:
+        """获取所有临时会话ID（不可变快照）"""
+        return frozenset(self.ephemeral_chats)
+    
+    def iter_ephemeral(self) -> Iterator[str]:
+        """
+        遍历临时会话ID，不复制集合
+        
+        注意：遍历期间不可调用 track_ephemeral/untrack_ephemeral，
+        需要边遍历边修改时请使用 get_all_ephemeral() 快照
+        """
+        return iter(self.ephemeral_chats)
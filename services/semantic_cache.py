@@ -0,0 +1,106 @@
+"""
+语义缓存服务
+对同一会话内高度相似的提问直接返回已缓存的回复，跳过Gemini API调用
+"""
+import asyncio
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class SemanticCacheHit:
+    """语义缓存命中结果"""
+    response: str
+    similarity: float
+
+
+class SemanticCache:
+    """按会话隔离的语义缓存（基于Gemini文本嵌入的余弦相似度）"""
+
+    def __init__(
+        self,
+        client: Optional[Any] = None,
+        embedding_model: str = "text-embedding-004",
+        threshold: float = 0.92,
+        max_entries_per_conversation: int = 256,
+        max_conversations: int = 64,
+        enabled: bool = True
+    ):
+        self.client = client  # GeminiClientEnhanced，可由服务层在初始化时注入
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.max_entries_per_conversation = max_entries_per_conversation
+        self.max_conversations = max_conversations
+        self.enabled = enabled
+        # 会话ID -> [(归一化向量, 回复文本)]，按会话LRU淘汰
+        self._entries: "OrderedDict[str, List[Tuple[List[float], str]]]" = OrderedDict()
+
+    async def embed(self, text: str) -> List[float]:
+        """计算文本的归一化嵌入向量"""
+        if not self.client or not getattr(self.client, 'client', None):
+            raise RuntimeError("Semantic cache client not initialized")
+
+        result = await asyncio.to_thread(
+            self.client.client.models.embed_content,
+            model=self.embedding_model,
+            contents=text
+        )
+        return self._normalize(result.embeddings[0].values)
+
+    def lookup(
+        self,
+        conversation_id: str,
+        embedding: List[float],
+        threshold: Optional[float] = None
+    ) -> Optional[SemanticCacheHit]:
+        """在会话内查找最相似的已缓存提问"""
+        entries = self._entries.get(conversation_id)
+        if not entries:
+            return None
+
+        self._entries.move_to_end(conversation_id)
+        threshold = self.threshold if threshold is None else threshold
+
+        best: Optional[SemanticCacheHit] = None
+        for cached_embedding, response in entries:
+            # 向量已归一化，点积即余弦相似度
+            similarity = sum(a * b for a, b in zip(cached_embedding, embedding))
+            if similarity >= threshold and (best is None or similarity > best.similarity):
+                best = SemanticCacheHit(response=response, similarity=similarity)
+        return best
+
+    def store(self, conversation_id: str, embedding: List[float], response: str) -> None:
+        """缓存提问向量与对应回复"""
+        entries = self._entries.setdefault(conversation_id, [])
+        self._entries.move_to_end(conversation_id)
+        entries.append((embedding, response))
+        if len(entries) > self.max_entries_per_conversation:
+            del entries[0]
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, conversation_id: str) -> None:
+        """清除指定会话的缓存"""
+        self._entries.pop(conversation_id, None)
+
+    def clear(self) -> None:
+        """清除所有缓存"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        return {
+            "conversations": len(self._entries),
+            "entries": sum(len(entries) for entries in self._entries.values())
+        }
+
+    @staticmethod
+    def _normalize(vector) -> List[float]:
+        """将向量归一化为单位长度"""
+        values = list(vector)
+        norm = math.sqrt(sum(v * v for v in values))
+        if norm == 0:
+            return values
+        return [v / norm for v in values]
@@ -4,6 +4,7 @@
 from typing import Any, Optional
 import sys
 import os
+import threading
 
 try:
     from geminichat.domain.model_type import ModelType
@@ -28,6 +29,7 @@ class SettingsService:
     """设置服务"""
     
     def __init__(self, initial_model: Optional[Any] = None):
+        self._settings_lock = threading.Lock()
         try:
             if ConfigRepository:
                 self.config_repo = ConfigRepository()
@@ -41,12 +43,16 @@ class SettingsService:
             self.initial_model = None
     
     def get_settings(self) -> Optional[Any]:
-        """获取设置"""
-        if not self._settings and self.config_repo:
-            try:
-                self._settings = self.config_repo.get_settings()
-            except Exception:
-                pass
+        """获取设置（线程安全，首次访问时加载并缓存）"""
+        if self._settings is not None:
+            return self._settings
+        with self._settings_lock:
+            # 双重检查：等待锁期间其他线程可能已完成加载
+            if self._settings is None and self.config_repo:
+                try:
+                    self._settings = self.config_repo.get_settings()
+                except Exception:
+                    pass
         return self._settings
     
     def update_setting(self, key: str, value: Any) -> bool:
@@ -55,7 +61,8 @@ class SettingsService:
             result = self.config_repo.update_setting(key, value)
             if result:
                 # 重新加载设置
-                self._settings = None
+                with self._settings_lock:
+                    self._settings = None
                 self.get_settings()
             return result
         return False
@@ -3,6 +3,7 @@
 自动清理空的"新聊天"记录
 """
 import json
+import os
 import sys
 from pathlib import Path
 from datetime import datetime
@@ -11,13 +12,19 @@ from typing import List, Tuple, Optional
 # 添加项目根目录到路径
 sys.path.append(str(Path(__file__).parent.parent))
 
+from geminichat.infrastructure.history_repo import HistoryRepository
+
 # 需要跳过的特殊文件
-SKIP_FILES = {'folders.json'}
+SKIP_FILES = HistoryRepository.SKIP_FILES
+
+
+# 根据文件名判断是否为有效的对话文件，与历史仓储共用同一规则
+is_conversation_name = HistoryRepository.is_conversation_name
 
 
 def is_conversation_file(file_path: Path) -> bool:
     """判断是否为有效的对话文件"""
-    return file_path.suffix == '.json' and file_path.name not in SKIP_FILES
+    return is_conversation_name(file_path.name)
 
 
 def get_chat_history_folders() -> List[Path]:
@@ -110,16 +117,20 @@ def auto_clean_empty_chats(startup_time: Optional[datetime] = None, silent: bool
     empty_chats = []
     
     for folder in folders:
-        json_files = list(folder.glob("*.json"))
-        for file_path in json_files:
-            # 使用通用过滤函数跳过特殊文件
-            if not is_conversation_file(file_path):
-                continue
+        # os.scandir 直接提供纯字符串文件名，避免为每个文件构造 Path 再取属性
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                # 跳过特殊文件和非JSON文件
+                if not is_conversation_name(entry.name):
+                    continue
+                if not entry.is_file():
+                    continue
                 
-            # 检查是否为空的临时会话
-            is_empty_ephemeral, reason = is_empty_ephemeral_chat(file_path, startup_time)
-            if is_empty_ephemeral:
-                empty_chats.append((file_path, f"空的临时会话: {reason}"))
+                # 检查是否为空的临时会话
+                file_path = Path(entry.path)
+                is_empty_ephemeral, reason = is_empty_ephemeral_chat(file_path, startup_time)
+                if is_empty_ephemeral:
+                    empty_chats.append((file_path, f"空的临时会话: {reason}"))
     
     # 删除找到的空聊天文件
     for file_path, reason in empty_chats:
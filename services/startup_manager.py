@@ -1,17 +1,80 @@
 # services/startup_manager.py
 # 启动管理器 - 协调应用启动流程
 
+import functools
+import json
+import mimetypes
+import os
 import sys
 import logging
-from typing import Optional, List
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, List
 from pathlib import Path
 
+try:
+    import orjson  # 可选依赖，C实现的JSON解析更快
+except ImportError:
+    import json as orjson  # 回退到标准库，json.loads 同样接受 bytes
+
+try:
+    import ijson  # 可选依赖，流式解析，扫描时无需构建整个消息列表
+except ImportError:
+    ijson = None
+
 from geminichat.domain.app_state import AppStateManager, PayloadParser, Payload, AppState, AppStateType
 from geminichat.domain.conversation import Conversation
+from geminichat.domain.message import Message, MessageRole
+from geminichat.domain.attachment import Attachment, AttachmentType
+from geminichat.infrastructure.history_repo import HistoryRepository
 from services.persistency_manager import PersistencyManager
 
 logger = logging.getLogger(__name__)
 
+# 尚未计算过最近活跃会话时的占位值（None 是合法结果）
+_UNSET = object()
+
+# 扫描历史文件时并行读取的最大线程数
+_SCAN_MAX_WORKERS = 16
+
+
+@functools.lru_cache(maxsize=1)
+def _get_config():
+    """延迟加载配置类（首次导入会读取 .env），之后复用同一对象"""
+    from geminichat.config.secrets import Config
+    return Config
+
+
+@functools.lru_cache(maxsize=1)
+def _history_dir() -> Path:
+    """会话历史目录（只构造一次 Path 对象）"""
+    return Path(_get_config().CHAT_HISTORY_DIR)
+
+
+# 附件类型 -> 文件扩展名
+_ATTACHMENT_EXT_GROUPS = {
+    AttachmentType.IMAGE: ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'),
+    AttachmentType.VIDEO: ('.mp4', '.avi', '.mov', '.mkv', '.wmv'),
+    AttachmentType.AUDIO: ('.mp3', '.wav', '.flac', '.aac', '.ogg'),
+    AttachmentType.CODE: ('.py', '.js', '.html', '.css', '.cpp', '.java', '.go', '.rs'),
+    AttachmentType.DOCUMENT: ('.pdf', '.doc', '.docx', '.txt', '.md', '.rtf'),
+}
+
+# 文件扩展名 -> 附件类型（由上表展开，供 O(1) 查找）
+_EXT_TO_TYPE = {
+    ext: attachment_type
+    for attachment_type, extensions in _ATTACHMENT_EXT_GROUPS.items()
+    for ext in extensions
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _mime_for_suffix(suffix: str) -> str:
+    """按扩展名猜测MIME类型（结果缓存）"""
+    mime_type, _ = mimetypes.guess_type("x" + suffix)
+    return mime_type or "application/octet-stream"
+
 
 class StartupManager:
     """启动管理器"""
@@ -21,6 +84,13 @@ class StartupManager:
         self.settings_service = settings_service
         self.state_manager = AppStateManager()
         self.persistency_manager = PersistencyManager(history_service)
+        self._last_active_chat_id = _UNSET
+        self._command_line_payload = _UNSET
+        self._cached_state: Optional[AppState] = None
+        # 启动时确定一次会话加载方式，避免每次加载都探测 history_service 的能力
+        self._load_fn = (getattr(history_service, 'load', None)
+                         or getattr(history_service, 'get_conversation', None)
+                         or self._load_chat_from_file)
     
     def determine_startup_state(self) -> AppState:
         """
@@ -42,7 +112,12 @@ class StartupManager:
                -> Next: ChatView(last_active_chat_id)
           ELSE
                -> Next: Welcome
+        
+        启动状态在进程内是确定的，首次计算后缓存
         """
+        if self._cached_state is not None:
+            return self._cached_state
+        
         # 解析命令行参数
         incoming_payload = self._parse_command_line_args()
         
@@ -61,6 +136,7 @@ class StartupManager:
         if startup_state.current_chat_id:
             logger.info(f"恢复会话: {startup_state.current_chat_id}")
         
+        self._cached_state = startup_state
         return startup_state
     
     def create_chat_with_payload(self, payload: Payload) -> Conversation:
@@ -92,13 +168,7 @@ class StartupManager:
         Action A3: open_chat(last_active_chat_id)
         """
         try:
-            if hasattr(self.history_service, 'load'):
-                return self.history_service.load(chat_id)
-            elif hasattr(self.history_service, 'get_conversation'):
-                return self.history_service.get_conversation(chat_id)
-            else:
-                # 直接从文件加载
-                return self._load_chat_from_file(chat_id)
+            return self._load_fn(chat_id)
         except Exception as e:
             logger.error(f"加载会话失败 {chat_id}: {e}")
             return None
@@ -141,21 +211,61 @@ class StartupManager:
             return True, new_chat
     
     def _parse_command_line_args(self) -> Optional[Payload]:
-        """解析命令行参数"""
-        return PayloadParser.parse_command_args(sys.argv)
+        """解析命令行参数（进程内 argv 不变，只解析一次）"""
+        if self._command_line_payload is _UNSET:
+            # 常见的无参数启动直接跳过解析器
+            if len(sys.argv) <= 1:
+                self._command_line_payload = None
+            else:
+                self._command_line_payload = PayloadParser.parse_command_args(sys.argv)
+        return self._command_line_payload
+    
+    def record_last_active_chat(self, chat_id: str):
+        """记录最近活跃的会话ID，下次启动时无需扫描历史目录"""
+        try:
+            record = {"id": chat_id}
+            with open(_get_config().LAST_ACTIVE_PATH, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            self._last_active_chat_id = chat_id
+        except OSError as e:
+            logger.warning(f"记录最近活跃会话失败 {chat_id}: {e}")
     
     def _get_last_active_chat_id(self) -> Optional[str]:
-        """获取最近活跃的会话ID"""
+        """获取最近活跃的会话ID（同一进程内只计算一次）"""
+        if self._last_active_chat_id is _UNSET:
+            self._last_active_chat_id = self._lookup_last_active_chat_id()
+        return self._last_active_chat_id
+    
+    def _lookup_last_active_chat_id(self) -> Optional[str]:
+        """查找最近活跃的会话ID：设置服务 > 记录文件 > 历史记录扫描"""
         try:
             if self.settings_service and hasattr(self.settings_service, 'get_last_active_chat'):
                 return self.settings_service.get_last_active_chat()
-            else:
-                # 从历史记录中获取最近的会话
-                return self._get_most_recent_chat_id()
+            
+            chat_id = self._read_last_active_record()
+            if chat_id:
+                return chat_id
+            
+            # 从历史记录中获取最近的会话
+            return self._get_most_recent_chat_id()
         except Exception as e:
             logger.error(f"获取最近活跃会话失败: {e}")
             return None
     
+    def _read_last_active_record(self) -> Optional[str]:
+        """读取最近活跃会话记录，会话文件已不存在或不是持久化的非空会话时视为无效"""
+        Config = _get_config()
+        
+        try:
+            with open(Config.LAST_ACTIVE_PATH, 'rb') as f:
+                record = orjson.loads(f.read())
+            chat_id = record.get('id')
+            if chat_id and self._read_persistent_chat_id(str(_history_dir() / f"{chat_id}.json")) == chat_id:
+                return chat_id
+        except (OSError, ValueError, AttributeError):
+            pass
+        return None
+    
     def _get_most_recent_chat_id(self) -> Optional[str]:
         """从历史记录中获取最近的会话ID"""
         try:
@@ -167,9 +277,8 @@ class StartupManager:
             elif hasattr(self.history_service, 'get_all_conversations'):
                 all_convs = self.history_service.get_all_conversations()
                 if all_convs:
-                    # 按更新时间排序
-                    sorted_convs = sorted(all_convs, key=lambda x: x.get('updated_at', ''), reverse=True)
-                    return sorted_convs[0].get('id')
+                    # 只需更新时间最新的一个，无需整体排序
+                    return max(all_convs, key=lambda x: x.get('updated_at', '')).get('id')
             
             # 直接从文件系统获取
             return self._get_most_recent_from_filesystem()
@@ -177,50 +286,118 @@ class StartupManager:
             logger.error(f"获取最近会话ID失败: {e}")
             return None
     
+    @staticmethod
+    def _get_most_recent_from_index(index: Dict[str, dict]) -> Optional[str]:
+        """从已校正的会话索引中获取最近的持久化非空会话ID"""
+        candidates = [
+            (entry.get('updated_at', ''), chat_id)
+            for chat_id, entry in index.items()
+            if not entry.get('is_ephemeral', False) and entry.get('has_messages')
+        ]
+        if not candidates:
+            return None
+        
+        _, chat_id = max(candidates)
+        return chat_id
+    
     def _get_most_recent_from_filesystem(self) -> Optional[str]:
         """从文件系统获取最近的会话ID"""
         try:
-            from geminichat.config.secrets import Config
-            import json
-            
-            history_dir = Path(Config.CHAT_HISTORY_DIR)
+            history_dir = _history_dir()
             if not history_dir.exists():
                 return None
             
-            chat_files = []
-            for file_path in history_dir.glob("*.json"):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        chat_data = json.load(f)
-                        # 只考虑持久化的非空会话
-                        if (not chat_data.get('is_ephemeral', False) and 
-                            chat_data.get('messages', [])):
-                            chat_files.append((file_path.stat().st_mtime, chat_data.get('id')))
-                except Exception:
-                    continue
+            # 按目录校正会话索引：已删除的条目移除，缺失或过期的条目重新解析并写回，
+            # 之后的启动只需读取索引和目录的 stat 信息
+            try:
+                index = HistoryRepository(str(history_dir)).refresh_index()
+            except Exception as e:
+                logger.warning(f"校正会话索引失败，回退到目录扫描: {e}")
+            else:
+                return self._get_most_recent_from_index(index)
+            
+            # 先只取修改时间（scandir 一次系统调用即可拿到 stat 信息），不解析内容
+            candidates = []
+            with os.scandir(history_dir) as entries:
+                for entry in entries:
+                    if not HistoryRepository.is_conversation_name(entry.name):
+                        continue
+                    try:
+                        candidates.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        continue
+            
+            if not candidates:
+                return None
+            
+            # 从最新的文件开始解析，找到第一个持久化的非空会话即返回
+            candidates.sort(reverse=True)
+            paths = [file_path for _, file_path in candidates]
             
-            if chat_files:
-                # 按修改时间排序，返回最新的
-                chat_files.sort(reverse=True)
-                return chat_files[0][1]
+            # 常见情况下最新的文件就符合条件，无需启动线程池
+            chat_id = self._read_persistent_chat_id(paths[0])
+            if chat_id or len(paths) == 1:
+                return chat_id
+            
+            # 其余文件按批次并行读取，批内保持从新到旧的顺序
+            remaining = paths[1:]
+            with ThreadPoolExecutor(max_workers=min(_SCAN_MAX_WORKERS, len(remaining))) as executor:
+                for start in range(0, len(remaining), _SCAN_MAX_WORKERS):
+                    batch = remaining[start:start + _SCAN_MAX_WORKERS]
+                    for chat_id in executor.map(self._read_persistent_chat_id, batch):
+                        if chat_id:
+                            return chat_id
         except Exception as e:
             logger.error(f"从文件系统获取最近会话失败: {e}")
         
         return None
     
+    def _read_persistent_chat_id(self, file_path: str) -> Optional[str]:
+        """读取会话文件，若为持久化的非空会话则返回其ID"""
+        if ijson is not None:
+            return self._stream_persistent_chat_id(file_path)
+        
+        try:
+            chat_data = orjson.loads(Path(file_path).read_bytes())
+            # 只考虑持久化的非空会话
+            if not chat_data.get('is_ephemeral', False) and chat_data.get('messages', []):
+                return chat_data.get('id')
+        except Exception:
+            pass
+        return None
+    
+    def _stream_persistent_chat_id(self, file_path: str) -> Optional[str]:
+        """流式解析会话文件的顶层字段，不实例化消息内容"""
+        chat_id = None
+        has_messages = False
+        seen_ephemeral = False
+        try:
+            with open(file_path, 'rb') as f:
+                for prefix, event, value in ijson.parse(f):
+                    if prefix == 'id':
+                        chat_id = value
+                    elif prefix == 'is_ephemeral':
+                        if value:
+                            return None
+                        seen_ephemeral = True
+                    elif prefix == 'messages.item' and not has_messages:
+                        has_messages = True
+                    if chat_id is not None and has_messages and seen_ephemeral:
+                        break
+        except Exception:
+            return None
+        
+        # 缺少 is_ephemeral 字段时按持久化会话处理，与完整解析的逻辑一致
+        return chat_id if has_messages else None
+    
     def _load_chat_from_file(self, chat_id: str) -> Optional[Conversation]:
         """直接从文件加载会话"""
         try:
-            from geminichat.config.secrets import Config
-            import json
-            
-            file_path = Path(Config.CHAT_HISTORY_DIR) / f"{chat_id}.json"
-            if not file_path.exists():
-                return None
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                chat_data = json.load(f)
-                return Conversation.from_dict(chat_data)
+            file_path = _history_dir() / f"{chat_id}.json"
+            chat_data = orjson.loads(file_path.read_bytes())
+            return Conversation.from_dict(chat_data)
+        except FileNotFoundError:
+            return None
         except Exception as e:
             logger.error(f"从文件加载会话失败 {chat_id}: {e}")
             return None
@@ -241,59 +418,56 @@ class StartupManager:
     
     def _prefill_file_content(self, conversation: Conversation, payload: Payload):
         """预填充文件内容"""
-        from geminichat.domain.message import Message, MessageRole
-        from geminichat.domain.attachment import Attachment, AttachmentType
-        from datetime import datetime
-        import os
-        import uuid
-        
         file_path = payload.source
-        if not Path(file_path).exists():
+        name = Path(file_path).name
+        
+        # 一次 stat 同时完成存在性检查和大小读取
+        try:
+            file_stat = os.stat(file_path)
+        except FileNotFoundError:
             logger.warning(f"文件不存在: {file_path}")
             return
         
+        # 附件与消息共用同一时间戳
+        now = datetime.now()
+        
         # 创建附件
         try:
-            file_stat = os.stat(file_path)
             attachment = Attachment(
-                id=f"attach_{uuid.uuid4()}",
+                id=f"attach_{uuid.uuid4().hex}",
                 file_path=file_path,
-                original_name=Path(file_path).name,
+                original_name=name,
                 file_size=file_stat.st_size,
                 mime_type=self._guess_mime_type(file_path),
                 attachment_type=self._guess_attachment_type(file_path),
-                uploaded_at=datetime.now()
+                uploaded_at=now
             )
             conversation.add_attachment(attachment)
             
             # 添加用户消息
-            message_content = f"请帮我分析这个文件: {Path(file_path).name}"
+            message_content = f"请帮我分析这个文件: {name}"
             message = Message(
-                id=str(uuid.uuid4()),
+                id=uuid.uuid4().hex,
                 role=MessageRole.USER,
                 content=message_content,
-                timestamp=datetime.now()
+                timestamp=now
             )
             conversation.add_message(message)
             
             # 设置标题
             if not conversation.title:
-                conversation.title = f"分析文件: {Path(file_path).name}"
+                conversation.title = f"分析文件: {name}"
                 
         except Exception as e:
             logger.error(f"处理文件附件失败: {e}")
     
     def _prefill_url_content(self, conversation: Conversation, payload: Payload):
         """预填充URL内容"""
-        from geminichat.domain.message import Message, MessageRole
-        from datetime import datetime
-        import uuid
-        
         url = payload.source
         message_content = f"请帮我分析这个网页: {url}"
         
         message = Message(
-            id=str(uuid.uuid4()),
+            id=uuid.uuid4().hex,
             role=MessageRole.USER,
             content=message_content,
             timestamp=datetime.now()
@@ -306,13 +480,9 @@ class StartupManager:
     
     def _prefill_text_content(self, conversation: Conversation, payload: Payload):
         """预填充文本内容"""
-        from geminichat.domain.message import Message, MessageRole
-        from datetime import datetime
-        import uuid
-        
         text = payload.source
         message = Message(
-            id=str(uuid.uuid4()),
+            id=uuid.uuid4().hex,
             role=MessageRole.USER,
             content=text,
             timestamp=datetime.now()
@@ -325,25 +495,8 @@ class StartupManager:
     
     def _guess_mime_type(self, file_path: str) -> str:
         """猜测文件MIME类型"""
-        import mimetypes
-        mime_type, _ = mimetypes.guess_type(file_path)
-        return mime_type or "application/octet-stream"
+        return _mime_for_suffix(Path(file_path).suffix.lower())
     
     def _guess_attachment_type(self, file_path: str):
         """猜测附件类型"""
-        from geminichat.domain.attachment import AttachmentType
-        
-        ext = Path(file_path).suffix.lower()
-        
-        if ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']:
-            return AttachmentType.IMAGE
-        elif ext in ['.mp4', '.avi', '.mov', '.mkv', '.wmv']:
-            return AttachmentType.VIDEO
-        elif ext in ['.mp3', '.wav', '.flac', '.aac', '.ogg']:
-            return AttachmentType.AUDIO
-        elif ext in ['.py', '.js', '.html', '.css', '.cpp', '.java', '.go', '.rs']:
-            return AttachmentType.CODE
-        elif ext in ['.pdf', '.doc', '.docx', '.txt', '.md', '.rtf']:
-            return AttachmentType.DOCUMENT
-        else:
-            return AttachmentType.OTHER
+        return _EXT_TO_TYPE.get(Path(file_path).suffix.lower(), AttachmentType.OTHER)
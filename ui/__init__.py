@@ -2,24 +2,43 @@
 """
 用户界面组件模块
 优先导出增强版UI组件，保持向后兼容性
-"""
 
-# 优先导出增强版UI组件
-try:
-    from .main_window_enhanced import EnhancedMainWindow as MainWindow
-    from .chat_tab import EnhancedChatTab as ChatTab
-    from .chat_input import EnhancedChatInput as ChatInput
-    from .file_upload_widget import EnhancedFileUploadWidget as FileUploadWidget
-    print("✅ 导出增强版UI组件")
-    ENHANCED_UI = True
-except ImportError:
-    from .main_window import MainWindow
-    from .chat_tab import ChatTab
-    from .file_upload_widget import FileUploadWidget
-    print("⚠️ 回退到基础版UI组件")
-    ENHANCED_UI = False
+组件在首次访问时才导入（PEP 562），导入 ui 包本身不会加载Qt控件
+"""
+import importlib
+import importlib.util
 
 from .ui_config import SimpleSettingsService, SimpleGeminiService
 
-__all__ = ['MainWindow', 'ChatTab', 'FileUploadWidget', 'SimpleSettingsService', 'SimpleGeminiService', 'ENHANCED_UI']
+# 导出名 -> (增强版模块, 增强版类名, 基础版模块, 基础版类名)
+_LAZY_EXPORTS = {
+    'MainWindow': ('.main_window_enhanced', 'EnhancedMainWindow', '.main_window', 'MainWindow'),
+    'ChatTab': ('.chat_tab', 'EnhancedChatTab', '.chat_tab', 'ChatTab'),
+    'ChatInput': ('.chat_input', 'EnhancedChatInput', None, None),
+    'FileUploadWidget': ('.file_upload_widget', 'EnhancedFileUploadWidget', '.file_upload_widget', 'FileUploadWidget'),
+}
+
+# 只检查增强版模块是否存在，不执行其导入
+ENHANCED_UI = importlib.util.find_spec('.main_window_enhanced', __name__) is not None
+
+
+def _load_export(name):
+    """导入单个导出组件，增强版不可用时回退到基础版"""
+    enhanced_module, enhanced_class, fallback_module, fallback_class = _LAZY_EXPORTS[name]
+    try:
+        return getattr(importlib.import_module(enhanced_module, __name__), enhanced_class)
+    except ImportError:
+        if fallback_module is None:
+            raise
+        return getattr(importlib.import_module(fallback_module, __name__), fallback_class)
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = _load_export(name)
+        globals()[name] = value  # 缓存到模块，之后不再经过 __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
+__all__ = ['MainWindow', 'ChatTab', 'ChatInput', 'FileUploadWidget', 'SimpleSettingsService', 'SimpleGeminiService', 'ENHANCED_UI']
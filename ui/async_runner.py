@@ -0,0 +1,42 @@
+"""
+常驻的asyncio事件循环线程
+聊天请求和附件处理等协程都投递到同一个事件循环中执行，不再为每个任务创建线程和事件循环
+"""
+import asyncio
+import concurrent.futures
+from functools import lru_cache
+
+from PySide6.QtCore import QThread, QCoreApplication
+
+
+class AsyncRunner(QThread):
+    """常驻的asyncio事件循环线程，协程通过 submit() 投递执行"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loop = asyncio.new_event_loop()
+    
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    def submit(self, coro) -> concurrent.futures.Future:
+        """在事件循环线程中执行协程（线程安全）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def stop(self):
+        """停止事件循环并等待线程退出"""
+        if self.isRunning():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.wait()
+
+
+@lru_cache(maxsize=1)
+def get_async_runner() -> AsyncRunner:
+    """获取全局共享的事件循环线程，首次调用时启动，应用退出时停止"""
+    runner = AsyncRunner()
+    runner.start()
+    app = QCoreApplication.instance()
+    if app is not None:
+        app.aboutToQuit.connect(runner.stop)
+    return runner
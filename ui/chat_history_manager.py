@@ -2,32 +2,423 @@
 历史记录管理组件 - PySide6版本
 改进版本：采用行业标准的加载状态管理模式
 """
-from typing import Dict, List, Optional, Callable, Any, Union
+import time
+from typing import Dict, List, Optional, Callable, Any, Tuple, Union
 from pathlib import Path
-from functools import partial
+from functools import lru_cache, partial
 
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QTreeWidget, QTreeWidgetItem,
-    QPushButton, QMenu, QDialog, QLineEdit, QDialogButtonBox,
-    QLabel, QMessageBox, QApplication, QFrame, QScrollArea
+    QWidget, QVBoxLayout, QTreeView, QAbstractItemView,
+    QMenu, QDialog, QLineEdit, QDialogButtonBox,
+    QLabel, QMessageBox, QApplication, QFrame, QScrollArea,
+    QStyledItemDelegate, QToolTip
+)
+from PySide6.QtCore import (
+    Qt, Signal, QSize, QRect, QPoint, QEvent, QTimer,
+    QAbstractItemModel, QModelIndex, QPersistentModelIndex
 )
-from PySide6.QtCore import Qt, Signal, QSize
 from PySide6.QtGui import QIcon, QPixmap, QAction, QCursor
 
 from services.folder_service import FolderService
 from services.history_service import HistoryService
 
-# 延迟导入加载状态管理器，避免循环导入
-LOADING_MANAGER_AVAILABLE = False
+# 加载状态管理器（只依赖Qt，不会产生循环导入）
 try:
-    # 不在模块级别导入，而是在需要时动态导入
-    import importlib
-    loading_module = importlib.import_module('ui.loading_state_manager')
+    from .loading_state_manager import start_loading, finish_loading, error_loading
     LOADING_MANAGER_AVAILABLE = True
 except ImportError:
+    start_loading = finish_loading = error_loading = None
+    LOADING_MANAGER_AVAILABLE = False
     print("加载状态管理器不可用，使用简单的加载提示")
 
 
+@lru_cache(maxsize=1)
+def _get_icons() -> Dict[str, QIcon]:
+    """加载图标（所有管理器实例共享同一份）"""
+    icons = {}
+    icon_path = Path(__file__).parent / "resources" / "icons"
+    
+    icon_files = {
+        "delete": "delete.png",
+        "rename": "rename.png", 
+        "folder": "folder.png",
+        "star": "star.png",
+        "starred": "starred.png"
+    }
+    
+    for name, filename in icon_files.items():
+        file_path = icon_path / filename
+        if file_path.exists():
+            icons[name] = QIcon(str(file_path))
+        else:
+            # 创建空图标作为备用
+            icons[name] = QIcon()
+            
+    return icons
+
+
+@lru_cache(maxsize=1)
+def _get_pixmaps() -> Dict[str, QPixmap]:
+    """预先按操作列尺寸栅格化的图标，绘制时直接贴图"""
+    size = ChatActionsDelegate.ICON_SIZE
+    return {name: icon.pixmap(size, size) for name, icon in _get_icons().items()}
+
+
+class ChatHistoryModel(QAbstractItemModel):
+    """历史记录树模型：顶层为文件夹，子项为会话，直接包装文件夹与会话列表
+    
+    文件夹索引的 internalId 为 0；会话索引的 internalId 为所属文件夹的稳定键，
+    增删文件夹时子项索引不受行号变化影响。
+    每个文件夹下的会话按批次通过 fetchMore 加载，文件夹末行滚入视口时再加载下一批
+    """
+    
+    HEADERS = ("聊天记录", "操作")
+    FETCH_BATCH = 50
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._folders: List[Dict] = []  # [{"id", "name"}]
+        self._folder_chats: List[List[Any]] = []  # 与 _folders 一一对应的会话列表
+        self._folder_keys: List[int] = []  # 与 _folders 一一对应的稳定键
+        self._key_rows: Dict[int, int] = {}  # 稳定键 -> 当前行号
+        self._loaded_counts: List[int] = []  # 与 _folders 一一对应，已暴露给视图的会话行数
+        self._chats_by_id: Dict[str, Any] = {}  # 会话ID -> 会话对象（含尚未加载的行）
+        self._next_key = 1
+        self._starred: set = set()  # 星标会话ID
+        self._loading: set = set()  # 正在加载的会话ID
+        # 会话ID -> 各文件夹下的持久索引，行号变化由Qt自动维护
+        self._chat_index: Dict[str, List[QPersistentModelIndex]] = {}
+        self.folder_icon = QIcon()
+    
+    def set_history(self, folders: List[Dict], folder_chats: List[List[Any]], starred: set):
+        """整体替换数据，只触发一次模型重置"""
+        self.beginResetModel()
+        self._folders = folders
+        self._folder_chats = folder_chats
+        self._folder_keys = [self._new_key() for _ in folders]
+        self._rebuild_key_rows()
+        self._loaded_counts = [min(len(chats), self.FETCH_BATCH) for chats in folder_chats]
+        self._chats_by_id = {chat.id: chat for chats in folder_chats for chat in chats}
+        self._starred = starred
+        self._loading.clear()
+        self.endResetModel()
+        
+        self._chat_index = {}
+        for folder_row, chats in enumerate(self._folder_chats):
+            self._index_chats(folder_row, 0, chats[:self._loaded_counts[folder_row]])
+    
+    def _index_chats(self, folder_row: int, first: int, chats: List[Any]):
+        """为文件夹下从 first 行开始的会话登记持久索引"""
+        key = self._folder_keys[folder_row]
+        for row, chat in enumerate(chats, first):
+            self._chat_index.setdefault(chat.id, []).append(
+                QPersistentModelIndex(self.createIndex(row, 0, key))
+            )
+    
+    def _new_key(self) -> int:
+        key = self._next_key
+        self._next_key += 1
+        return key
+    
+    def _rebuild_key_rows(self):
+        self._key_rows = {key: row for row, key in enumerate(self._folder_keys)}
+    
+    # ---- QAbstractItemModel 接口 ----
+    
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        return self.createIndex(row, column, self._folder_keys[parent.row()])
+    
+    def parent(self, index=QModelIndex()):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(self._key_rows[index.internalId()], 0, 0)
+    
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._folders)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return self._loaded_counts[parent.row()]
+        return 0
+    
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self._folders)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return bool(self._folder_chats[parent.row()])
+        return False
+    
+    def canFetchMore(self, parent):
+        if not parent.isValid() or parent.internalId() != 0:
+            return False
+        row = parent.row()
+        return self._loaded_counts[row] < len(self._folder_chats[row])
+    
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        row = parent.row()
+        first = self._loaded_counts[row]
+        last = min(first + self.FETCH_BATCH, len(self._folder_chats[row])) - 1
+        self.beginInsertRows(parent, first, last)
+        self._loaded_counts[row] = last + 1
+        self.endInsertRows()
+        self._index_chats(row, first, self._folder_chats[row][first:last + 1])
+    
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+    
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        chat = self.chat_at(index)
+        if chat is not None and chat.id in self._loading:
+            return Qt.ItemFlag.NoItemFlags  # 加载中禁止重复点击
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        column = index.column()
+        if index.internalId() == 0:
+            folder = self._folders[index.row()]
+            if column != 0:
+                return None
+            if role == Qt.ItemDataRole.DisplayRole:
+                return folder["name"]
+            if role == Qt.ItemDataRole.DecorationRole and folder["id"] != "uncategorized":
+                return self.folder_icon
+            if role == Qt.ItemDataRole.UserRole:
+                return folder["id"]
+            if role == Qt.ItemDataRole.UserRole + 1:
+                return "folder"
+            return None
+        
+        chat = self.chat_at(index)
+        if column == 1:
+            # 操作列：UserRole 为星标状态，由委托绘制图标
+            return chat.id in self._starred if role == Qt.ItemDataRole.UserRole else None
+        if role == Qt.ItemDataRole.DisplayRole:
+            title = chat.title or "未命名对话"
+            return f"⏳ {title}" if chat.id in self._loading else title
+        if role == Qt.ItemDataRole.UserRole:
+            return chat.id
+        if role == Qt.ItemDataRole.UserRole + 1:
+            return "chat"
+        return None
+    
+    # ---- 查询与增量更新 ----
+    
+    def chat_at(self, index) -> Optional[Any]:
+        """返回会话索引对应的会话对象，文件夹索引返回None"""
+        if not index.isValid() or index.internalId() == 0:
+            return None
+        return self._folder_chats[self._key_rows[index.internalId()]][index.row()]
+    
+    def chat_indexes(self, chat_id: str) -> List[QModelIndex]:
+        """返回会话在各文件夹下的索引（同一会话可能属于多个文件夹）"""
+        return [QModelIndex(index) for index in self._chat_index.get(chat_id, ()) if index.isValid()]
+    
+    def chat_title(self, chat_id: str) -> str:
+        chat = self._chats_by_id.get(chat_id)
+        return (chat.title or "未命名对话") if chat else ""
+    
+    def folder_row(self, folder_id: str) -> int:
+        """返回文件夹所在行，不存在时返回-1"""
+        for row, folder in enumerate(self._folders):
+            if folder["id"] == folder_id:
+                return row
+        return -1
+    
+    def folder_chats(self, folder_id: str) -> List[Any]:
+        row = self.folder_row(folder_id)
+        return list(self._folder_chats[row]) if row >= 0 else []
+    
+    def insert_folder(self, row: int, folder_id: str, name: str):
+        """在指定行插入一个空文件夹"""
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._folders.insert(row, {"id": folder_id, "name": name})
+        self._folder_chats.insert(row, [])
+        self._loaded_counts.insert(row, 0)
+        self._folder_keys.insert(row, self._new_key())
+        self._rebuild_key_rows()
+        self.endInsertRows()
+    
+    def rename_folder(self, folder_id: str, name: str):
+        row = self.folder_row(folder_id)
+        if row < 0:
+            return
+        self._folders[row]["name"] = name
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index)
+    
+    def remove_folder(self, folder_id: str):
+        """移除文件夹行（连同其下的会话行）"""
+        row = self.folder_row(folder_id)
+        if row < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._folders[row]
+        del self._folder_chats[row]
+        del self._loaded_counts[row]
+        del self._folder_keys[row]
+        self._rebuild_key_rows()
+        self.endRemoveRows()
+    
+    def append_chats(self, folder_id: str, chats: List[Any]):
+        """向文件夹末尾追加会话行"""
+        row = self.folder_row(folder_id)
+        if row < 0 or not chats:
+            return
+        folder_chats = self._folder_chats[row]
+        for chat in chats:
+            self._chats_by_id.setdefault(chat.id, chat)
+        
+        # 文件夹尚有未加载的行时，新会话排在其后，等待 fetchMore
+        if self._loaded_counts[row] < len(folder_chats):
+            folder_chats.extend(chats)
+            return
+        
+        first = len(folder_chats)
+        self.beginInsertRows(self.index(row, 0), first, first + len(chats) - 1)
+        folder_chats.extend(chats)
+        self._loaded_counts[row] = len(folder_chats)
+        self.endInsertRows()
+        self._index_chats(row, first, chats)
+    
+    def remove_chat(self, chat_id: str):
+        """从所有文件夹中移除会话行"""
+        for index in self.chat_indexes(chat_id):
+            folder_row = self._key_rows[index.internalId()]
+            self.beginRemoveRows(self.index(folder_row, 0), index.row(), index.row())
+            del self._folder_chats[folder_row][index.row()]
+            self._loaded_counts[folder_row] -= 1
+            self.endRemoveRows()
+        
+        # 尚未加载的行不在视图中，直接从列表移除
+        for folder_row, chats in enumerate(self._folder_chats):
+            loaded = self._loaded_counts[folder_row]
+            if len(chats) > loaded:
+                chats[loaded:] = [chat for chat in chats[loaded:] if chat.id != chat_id]
+        
+        self._chat_index.pop(chat_id, None)
+        self._chats_by_id.pop(chat_id, None)
+        self._starred.discard(chat_id)
+        self._loading.discard(chat_id)
+    
+    def update_chat(self, chat_id: str, title: Optional[str] = None, starred: Optional[bool] = None):
+        """更新会话标题或星标状态，只通知对应行重绘"""
+        indexes = self.chat_indexes(chat_id)
+        if title:
+            chat = self._chats_by_id.get(chat_id)
+            if chat is not None:
+                chat.title = title
+            for index in indexes:
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+        
+        # 星标未变化时不触发重绘；变化时只通知操作列单元格
+        if starred is not None and starred != (chat_id in self._starred):
+            if starred:
+                self._starred.add(chat_id)
+            else:
+                self._starred.discard(chat_id)
+            for index in indexes:
+                star_index = index.siblingAtColumn(1)
+                self.dataChanged.emit(star_index, star_index, [Qt.ItemDataRole.UserRole])
+    
+    def set_loading(self, chat_id: str, loading: bool):
+        """设置会话的加载状态"""
+        if loading:
+            self._loading.add(chat_id)
+        else:
+            self._loading.discard(chat_id)
+        self._emit_changed(self.chat_indexes(chat_id))
+    
+    def _emit_changed(self, indexes: List[QModelIndex]):
+        for index in indexes:
+            self.dataChanged.emit(index, index.siblingAtColumn(1))
+
+
+class ChatActionsDelegate(QStyledItemDelegate):
+    """操作列委托：直接绘制删除/重命名/文件夹/星标图标并处理点击，无需为每行创建按钮控件"""
+    
+    ICON_SIZE = 24
+    SPACING = 2
+    ACTIONS = ("delete", "rename", "folder", "star")
+    TOOLTIPS = {"delete": "删除", "rename": "重命名", "folder": "管理文件夹", "star": "星标"}
+    
+    def __init__(self, manager: "ChatHistoryManager"):
+        super().__init__(manager)
+        self._manager = manager
+        self._pixmaps = _get_pixmaps()
+    
+    @staticmethod
+    def _is_chat(index) -> bool:
+        return index.siblingAtColumn(0).data(Qt.ItemDataRole.UserRole + 1) == "chat"
+    
+    def _action_rects(self, rect: QRect):
+        """计算各操作图标在单元格内的区域"""
+        size = self.ICON_SIZE
+        top = rect.top() + (rect.height() - size) // 2
+        left = rect.left() + self.SPACING
+        return [
+            (action, QRect(left + i * (size + self.SPACING), top, size, size))
+            for i, action in enumerate(self.ACTIONS)
+        ]
+    
+    def _action_at(self, rect: QRect, pos: QPoint):
+        for action, action_rect in self._action_rects(rect):
+            if action_rect.contains(pos):
+                return action, action_rect
+        return None, None
+    
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        if not self._is_chat(index):
+            return
+        
+        is_starred = bool(index.data(Qt.ItemDataRole.UserRole))
+        for action, rect in self._action_rects(option.rect):
+            if action == "star":
+                action = "starred" if is_starred else "star"
+            pixmap = self._pixmaps.get(action)
+            if pixmap is not None and not pixmap.isNull():
+                painter.drawPixmap(rect.topLeft(), pixmap)
+    
+    def sizeHint(self, option, index):
+        hint = super().sizeHint(option, index)
+        width = len(self.ACTIONS) * (self.ICON_SIZE + self.SPACING) + self.SPACING
+        return QSize(max(hint.width(), width), max(hint.height(), self.ICON_SIZE + 2 * self.SPACING))
+    
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease and self._is_chat(index):
+            action, rect = self._action_at(option.rect, event.position().toPoint())
+            if action:
+                chat_id = index.siblingAtColumn(0).data(Qt.ItemDataRole.UserRole)
+                anchor = self._manager.tree.viewport().mapToGlobal(rect.bottomLeft())
+                # 延迟到事件处理结束后执行，避免在委托事件中删除当前行
+                QTimer.singleShot(0, lambda: self._manager._on_action_triggered(action, chat_id, anchor))
+                return True
+        return super().editorEvent(event, model, option, index)
+    
+    def helpEvent(self, event, view, option, index):
+        if event.type() == QEvent.Type.ToolTip and self._is_chat(index):
+            action, _ = self._action_at(option.rect, event.pos())
+            if action:
+                QToolTip.showText(event.globalPos(), self.TOOLTIPS[action], view)
+                return True
+        return super().helpEvent(event, view, option, index)
+
+
 class ChatHistoryManager(QWidget):
     """聊天记录管理组件 - PySide6版本"""
     
@@ -46,14 +437,26 @@ class ChatHistoryManager(QWidget):
         self.history_service = history_service
         self.folder_service = FolderService()
         self.on_chat_selected = on_chat_selected
-        
-        # 防重复点击的时间戳
-        self._last_click_time = 0
+        self._chat_to_folders: Dict[str, set] = {}  # 会话ID -> 所在文件夹ID集合，每次刷新重建
+        self._folders_cache: Optional[Tuple[float, List[Dict]]] = None  # (读取时间, 文件夹列表)
+        self._last_sig: Optional[int] = None  # 上次刷新数据的指纹，本地修改后清空
+        self._folder_menu_chat_id: Optional[str] = None  # 文件夹菜单当前针对的会话
+        
+        # 文件夹菜单只创建一次，每次显示前重建菜单项
+        self._folder_menu = QMenu(self)
+        self._folder_menu.aboutToShow.connect(self._rebuild_folder_menu)
+        self._folder_menu.triggered.connect(self._on_folder_action_triggered)
+        
+        # 防重复点击：计时器运行期间忽略新的点击
+        self._click_timer = QTimer(self)
+        self._click_timer.setSingleShot(True)
         self._click_delay = 300  # 300ms防抖动
         
-        # 防频繁刷新的时间戳
-        self._last_refresh_time = 0
-        self._refresh_delay = 100  # 100ms防抖动
+        # 合并短时间内的多次刷新请求，只在最后一次请求后刷新一次
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(100)  # 100ms防抖动
+        self._refresh_timer.timeout.connect(self._do_refresh)
         
         # 连接信号（只在没有回调函数时连接信号）
         if on_chat_selected and not callable(on_chat_selected):
@@ -62,45 +465,24 @@ class ChatHistoryManager(QWidget):
         # 如果传入的是回调函数，则不连接信号，避免重复调用
         
         # 加载图标
-        self.icons = self._load_icons()
+        self.icons = _get_icons()
         
         # 创建界面
         self._create_widgets()
         
         # 加载历史记录
-        self.refresh_history()
-    
-    def _load_icons(self) -> Dict[str, QIcon]:
-        """加载图标"""
-        icons = {}
-        icon_path = Path(__file__).parent / "resources" / "icons"
-        
-        icon_files = {
-            "delete": "delete.png",
-            "rename": "rename.png", 
-            "folder": "folder.png",
-            "star": "star.png",
-            "starred": "starred.png"
-        }
-        
-        for name, filename in icon_files.items():
-            file_path = icon_path / filename
-            if file_path.exists():
-                icons[name] = QIcon(str(file_path))
-            else:
-                # 创建空图标作为备用
-                icons[name] = QIcon()
-                
-        return icons
+        self._do_refresh()
     
     def _create_widgets(self):
         """创建界面组件"""
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         
-        # 创建树形视图
-        self.tree = QTreeWidget(self)
-        self.tree.setHeaderLabels(["聊天记录", "操作"])
+        # 创建树形视图（数据由 ChatHistoryModel 提供）
+        self.model = ChatHistoryModel(self)
+        self.model.folder_icon = self.icons.get("folder", QIcon())
+        self.tree = QTreeView(self)
+        self.tree.setModel(self.model)
         
         # 设置列宽 - 确保操作列有足够空间显示按钮
         self.tree.setColumnWidth(0, 160)
@@ -108,232 +490,161 @@ class ChatHistoryManager(QWidget):
         
         self.tree.setAlternatingRowColors(True)
         self.tree.setRootIsDecorated(True)
+        self.tree.setUniformRowHeights(True)  # 所有行等高，Qt 无需逐行计算尺寸
+        self.tree.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)  # 滚动时按需 fetchMore
         self.tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         
         # 显示表头以便看到操作列
         self.tree.setHeaderHidden(False)
         
+        # 操作列由委托绘制，不再为每行创建按钮控件
+        self.tree.setItemDelegateForColumn(1, ChatActionsDelegate(self))
+        
         # 连接信号
-        self.tree.itemClicked.connect(self._on_chat_selected)
+        self.tree.clicked.connect(self._on_chat_selected)
         self.tree.customContextMenuRequested.connect(self._show_context_menu)
+        # Qt 只对最后一个可见行的祖先调用 fetchMore，其他展开的文件夹由这里补齐
+        self.tree.verticalScrollBar().valueChanged.connect(self._fetch_visible_folders)
+        # 展开信号发出时子项尚未布局，等布局完成后再检查
+        self.tree.expanded.connect(lambda _index: QTimer.singleShot(0, self._fetch_visible_folders))
         
         layout.addWidget(self.tree)
     
+    def _fetch_visible_folders(self, *_):
+        """为末行已进入视口的展开文件夹加载下一批会话"""
+        viewport_height = self.tree.viewport().height()
+        for row in range(self.model.rowCount()):
+            folder_index = self.model.index(row, 0)
+            while self.tree.isExpanded(folder_index) and self.model.canFetchMore(folder_index):
+                last_row = self.model.rowCount(folder_index) - 1
+                if last_row >= 0:
+                    last_rect = self.tree.visualRect(self.model.index(last_row, 0, folder_index))
+                    if not last_rect.isValid() or last_rect.top() > viewport_height:
+                        break
+                self.model.fetchMore(folder_index)
+    
     def refresh_history(self):
-        """刷新历史记录"""
-        import time
-        
-        # 防频繁刷新检查
-        current_time = int(time.time() * 1000)  # 毫秒时间戳
-        if current_time - self._last_refresh_time < self._refresh_delay:
-            return  # 忽略过于频繁的刷新
-        
-        self._last_refresh_time = current_time
-        
-        # 清空树形视图
-        self.tree.clear()
+        """请求刷新历史记录（短时间内的多次请求合并为一次）"""
+        self._refresh_timer.start()
+    
+    def _do_refresh(self):
+        """立即刷新历史记录"""
         self._load_history()
     
     def _remove_chat_item(self, chat_id: str):
         """从树中移除指定的聊天记录项"""
-        for i in range(self.tree.topLevelItemCount()):
-            folder_item = self.tree.topLevelItem(i)
-            if folder_item:
-                # 检查文件夹下的聊天记录
-                for j in range(folder_item.childCount()):
-                    chat_item = folder_item.child(j)
-                    if chat_item and chat_item.data(0, Qt.ItemDataRole.UserRole) == chat_id:
-                        folder_item.removeChild(chat_item)
-                        # 如果文件夹为空且不是特殊文件夹，移除文件夹
-                        if folder_item.childCount() == 0:
-                            folder_type = folder_item.data(0, Qt.ItemDataRole.UserRole + 1)
-                            if folder_type not in ["starred", "all"]:
-                                self.tree.takeTopLevelItem(i)
-                        return
+        self._last_sig = None
+        self.model.remove_chat(chat_id)
     
     def _update_chat_item(self, chat_id: str, new_title: Optional[str] = None):
         """更新指定聊天记录项的显示"""
-        for i in range(self.tree.topLevelItemCount()):
-            folder_item = self.tree.topLevelItem(i)
-            if folder_item:
-                for j in range(folder_item.childCount()):
-                    chat_item = folder_item.child(j)
-                    if chat_item and chat_item.data(0, Qt.ItemDataRole.UserRole) == chat_id:
-                        if new_title:
-                            chat_item.setText(0, new_title)
-                        # 更新星标图标
-                        actions_widget = self.tree.itemWidget(chat_item, 1)
-                        if actions_widget:
-                            layout = actions_widget.layout()
-                            if layout and layout.count() >= 4:  # 星标按钮是第4个
-                                layout_item = layout.itemAt(3)
-                                if layout_item:
-                                    star_btn = layout_item.widget()
-                                    if star_btn and isinstance(star_btn, QPushButton):
-                                        current_folders = self.folder_service.get_chat_folders(chat_id)
-                                        is_starred = "starred" in current_folders
-                                        star_btn.setIcon(self.icons.get("starred" if is_starred else "star", QIcon()))
-                        return
+        self._last_sig = None
+        self.model.update_chat(chat_id, new_title, "starred" in self._chat_to_folders.get(chat_id, ()))
     
     def _load_history(self):
         folders = self.folder_service.list_folders()
+        self._folders_cache = (time.monotonic(), folders)
         
         # 获取所有会话
         conversations = self.history_service.list_conversations() if self.history_service else []
         
-        # 添加文件夹和会话
-        folder_items = {}
-        for folder in folders:
-            folder_id = folder["id"]
-            folder_name = folder["name"]
-            
-            # 创建文件夹节点
-            folder_item = QTreeWidgetItem(self.tree)
-            folder_item.setText(0, folder_name)
-            folder_item.setData(0, Qt.ItemDataRole.UserRole, folder_id)
-            folder_item.setData(0, Qt.ItemDataRole.UserRole + 1, "folder")
-            folder_item.setExpanded(True)
-            
-            # 如果有文件夹图标，设置图标
-            if "folder" in self.icons:
-                folder_item.setIcon(0, self.icons["folder"])
-            
-            folder_items[folder_id] = folder_item
-            
-            # 添加该文件夹下的会话
-            for conv in conversations:
-                if conv.id in folder["chats"]:
-                    self._add_chat_item(folder_item, conv)
-        
-        # 添加未分类的会话
-        uncategorized_item = QTreeWidgetItem(self.tree)
-        uncategorized_item.setText(0, "未分类")
-        uncategorized_item.setData(0, Qt.ItemDataRole.UserRole, "uncategorized")
-        uncategorized_item.setData(0, Qt.ItemDataRole.UserRole + 1, "folder")
-        uncategorized_item.setExpanded(True)
-        
-        # 收集所有已分类的聊天记录
-        all_folder_chats = set()
-        for folder in folders:
-            all_folder_chats.update(folder["chats"])
+        # 数据与上次刷新完全相同时跳过重建
+        sig = hash((
+            tuple((folder["id"], folder["name"], tuple(folder["chats"])) for folder in folders),
+            tuple((conv.id, conv.title) for conv in conversations)
+        ))
+        if sig == self._last_sig:
+            return
+        self._last_sig = sig
         
-        # 添加未分类的会话
+        # 建立会话 -> 文件夹的反向索引
+        self._chat_to_folders = {}
+        for folder in folders:
+            for chat_id in folder["chats"]:
+                self._chat_to_folders.setdefault(chat_id, set()).add(folder["id"])
+        
+        # 单次遍历会话即可分配到各文件夹，最后一个为未分类
+        folder_nodes = [{"id": folder["id"], "name": folder["name"]} for folder in folders]
+        folder_nodes.append({"id": "uncategorized", "name": "未分类"})
+        folder_rows = {node["id"]: row for row, node in enumerate(folder_nodes)}
+        folder_chats = [[] for _ in folder_nodes]
+        uncategorized = folder_chats[-1]
         for conv in conversations:
-            if conv.id not in all_folder_chats:
-                self._add_chat_item(uncategorized_item, conv)
-        
-        # 调整列宽
-        self.tree.resizeColumnToContents(0)
-    
-    def _add_chat_item(self, parent_item: QTreeWidgetItem, conversation: Any):
-        """添加聊天记录项"""
-        chat_item = QTreeWidgetItem(parent_item)
-        chat_item.setText(0, conversation.title or "未命名对话")
-        chat_item.setData(0, Qt.ItemDataRole.UserRole, conversation.id)
-        chat_item.setData(0, Qt.ItemDataRole.UserRole + 1, "chat")
-        
-        # 创建操作按钮容器
-        actions_widget = QWidget()
-        actions_layout = QHBoxLayout(actions_widget)
-        actions_layout.setContentsMargins(2, 2, 2, 2)
-        actions_layout.setSpacing(2)
-        
-        # 删除按钮
-        delete_btn = QPushButton()
-        delete_btn.setIcon(self.icons.get("delete", QIcon()))
-        delete_btn.setToolTip("删除")
-        delete_btn.setMaximumSize(QSize(24, 24))
-        delete_btn.clicked.connect(partial(self._delete_chat, conversation.id))
-        actions_layout.addWidget(delete_btn)
-        
-        # 重命名按钮
-        rename_btn = QPushButton()
-        rename_btn.setIcon(self.icons.get("rename", QIcon()))
-        rename_btn.setToolTip("重命名")
-        rename_btn.setMaximumSize(QSize(24, 24))
-        rename_btn.clicked.connect(partial(self._rename_chat, conversation.id))
-        actions_layout.addWidget(rename_btn)
-        
-        # 添加到文件夹按钮
-        folder_btn = QPushButton()
-        folder_btn.setIcon(self.icons.get("folder", QIcon()))
-        folder_btn.setToolTip("管理文件夹")
-        folder_btn.setMaximumSize(QSize(24, 24))
-        folder_btn.clicked.connect(partial(self._show_folder_menu, conversation.id, folder_btn))
-        actions_layout.addWidget(folder_btn)
-        
-        # 星标按钮
-        current_folders = self.folder_service.get_chat_folders(conversation.id)
-        is_starred = "starred" in current_folders
-        star_btn = QPushButton()
-        star_btn.setIcon(self.icons.get("starred" if is_starred else "star", QIcon()))
-        star_btn.setToolTip("星标")
-        star_btn.setMaximumSize(QSize(24, 24))
-        star_btn.clicked.connect(partial(self._toggle_star, conversation.id))
-        actions_layout.addWidget(star_btn)
-        
-        # 添加弹簧推到右边
-        actions_layout.addStretch()
-        
-        # 将操作组件设置到树形视图中
-        self.tree.setItemWidget(chat_item, 1, actions_widget)
-    
-    def _on_chat_selected(self, item: QTreeWidgetItem, column: int):
+            chat_folders = self._chat_to_folders.get(conv.id)
+            if not chat_folders:
+                uncategorized.append(conv)
+                continue
+            for folder_id in chat_folders:
+                folder_chats[folder_rows[folder_id]].append(conv)
+        
+        starred = {chat_id for chat_id, folder_ids in self._chat_to_folders.items() if "starred" in folder_ids}
+        
+        # 一次模型重置完成全部更新，Qt 只为可见行查询数据；
+        # 重置、展开和调整列宽期间暂停重绘，最后只绘制一次
+        self.tree.setUpdatesEnabled(False)
+        try:
+            self.model.set_history(folder_nodes, folder_chats, starred)
+            self.tree.expand(self.model.index(len(folder_nodes) - 1, 0))
+            
+            # 调整列宽
+            self.tree.resizeColumnToContents(0)
+        finally:
+            self.tree.setUpdatesEnabled(True)
+    
+    def _on_action_triggered(self, action: str, chat_id: str, anchor: QPoint):
+        """处理操作列图标的点击"""
+        if action == "delete":
+            self._delete_chat(chat_id)
+        elif action == "rename":
+            self._rename_chat(chat_id)
+        elif action == "folder":
+            self._show_folder_menu(chat_id, anchor)
+        elif action == "star":
+            self._toggle_star(chat_id)
+    
+    def _on_chat_selected(self, index: QModelIndex):
         """处理聊天记录单击事件 - 使用行业标准的异步加载模式"""
-        import time
+        # 操作列的点击由委托处理
+        if index.column() == 1:
+            return
         
         # 1. 防抖动检查 - 行业标准做法
-        current_time = int(time.time() * 1000)
-        if current_time - self._last_click_time < self._click_delay:
+        if self._click_timer.isActive():
             return
+        self._click_timer.start(self._click_delay)
         
-        self._last_click_time = current_time
-        
-        if not item:
+        if not index.isValid():
             return
             
-        item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-        item_id = item.data(0, Qt.ItemDataRole.UserRole)
+        item_type = index.data(Qt.ItemDataRole.UserRole + 1)
+        item_id = index.data(Qt.ItemDataRole.UserRole)
         
         if item_type == "chat" and item_id:
             # 2. 立即显示加载状态 - 提升用户体验
-            self._show_loading_state(item)
+            self._show_loading_state(item_id)
             
             # 3. 异步加载和处理 - 避免阻塞UI线程
-            self._load_chat_async(item_id, item)
+            self._load_chat_async(item_id)
     
-    def _show_loading_state(self, item: QTreeWidgetItem):
+    def _show_loading_state(self, chat_id: str):
         """显示加载状态 - 使用行业标准的加载管理器"""
-        original_text = item.text(0)
-        item.setData(0, Qt.ItemDataRole.UserRole + 2, original_text)  # 保存原始文本
-        
         if LOADING_MANAGER_AVAILABLE:
             # 使用加载状态管理器
-            chat_id = item.data(0, Qt.ItemDataRole.UserRole)
-            from .loading_state_manager import start_loading
-            start_loading(f"chat_load_{chat_id}", f"正在加载 {original_text}...", parent_widget=self)
+            start_loading(f"chat_load_{chat_id}", f"正在加载 {self.model.chat_title(chat_id)}...", parent_widget=self)
         
-        # 同时更新UI项目显示
-        item.setText(0, f"⏳ {original_text}")
-        item.setDisabled(True)  # 防止重复点击
+        # 同时更新UI项目显示，并禁止重复点击
+        self.model.set_loading(chat_id, True)
     
-    def _hide_loading_state(self, item: QTreeWidgetItem):
+    def _hide_loading_state(self, chat_id: str):
         """隐藏加载状态"""
-        original_text = item.data(0, Qt.ItemDataRole.UserRole + 2)
-        if original_text:
-            item.setText(0, original_text)
-        item.setDisabled(False)
+        self.model.set_loading(chat_id, False)
         
         if LOADING_MANAGER_AVAILABLE:
             # 完成加载状态
-            chat_id = item.data(0, Qt.ItemDataRole.UserRole)
-            from .loading_state_manager import finish_loading
             finish_loading(f"chat_load_{chat_id}")
     
-    def _load_chat_async(self, chat_id: str, item: QTreeWidgetItem):
-        """异步加载聊天 - 行业标准的异步处理模式"""
-        from PySide6.QtCore import QTimer
-        
+    def _load_chat_async(self, chat_id: str):
+        """加载聊天：推迟到下一轮事件循环执行，先让加载状态绘制出来"""
         def load_and_callback():
             try:
                 # 4. 错误处理和回退机制
@@ -349,34 +660,30 @@ class ChatHistoryManager(QWidget):
                     success = True
                 
                 # 5. 隐藏加载状态
-                self._hide_loading_state(item)
+                self._hide_loading_state(chat_id)
                 
                 # 6. 如果加载失败，显示错误提示
                 if not success:
-                    self._show_load_error(item, "加载失败")
+                    self._show_load_error(chat_id, "加载失败")
                     
             except Exception as e:
                 print(f"加载聊天记录异常: {e}")
-                self._hide_loading_state(item)
-                self._show_load_error(item, f"加载错误: {str(e)}")
+                self._hide_loading_state(chat_id)
+                self._show_load_error(chat_id, f"加载错误: {str(e)}")
         
-        # 使用QTimer实现异步执行，避免阻塞UI
-        QTimer.singleShot(50, load_and_callback)
+        # 回调会创建标签页等控件，必须在主线程执行，因此不放入线程池；
+        # 零延迟即可让出一次事件循环，无需额外等待
+        QTimer.singleShot(0, load_and_callback)
     
-    def _show_load_error(self, item: QTreeWidgetItem, error_msg: str):
+    def _show_load_error(self, chat_id: str, error_msg: str):
         """显示加载错误"""
         from PySide6.QtWidgets import QMessageBox
         
         # 恢复原始状态
-        original_text = item.data(0, Qt.ItemDataRole.UserRole + 2)
-        if original_text:
-            item.setText(0, original_text)
-        item.setDisabled(False)
+        self.model.set_loading(chat_id, False)
         
         if LOADING_MANAGER_AVAILABLE:
             # 使用加载状态管理器显示错误
-            chat_id = item.data(0, Qt.ItemDataRole.UserRole)
-            from .loading_state_manager import error_loading
             error_loading(f"chat_load_{chat_id}", error_msg)
         else:
             # 回退到简单的错误提示
@@ -398,10 +705,9 @@ class ChatHistoryManager(QWidget):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            # 从所有文件夹中移除
-            folders = self.folder_service.list_folders()
-            for folder in folders:
-                self.folder_service.remove_chat_from_folder(folder["id"], chat_id)
+            # 从所在的文件夹中移除
+            for folder_id in self._chat_to_folders.pop(chat_id, set()):
+                self.folder_service.remove_chat_from_folder(folder_id, chat_id)
             
             # 删除聊天记录文件
             if self.history_service and self.history_service.delete_conversation(chat_id):
@@ -417,67 +723,89 @@ class ChatHistoryManager(QWidget):
                 # 使用增量更新，而不是全量刷新
                 self._update_chat_item(chat_id, new_name)
     
-    def _show_folder_menu(self, chat_id: str, button: QPushButton):
-        """显示文件夹菜单"""
-        menu = QMenu(self)
+    def _show_folder_menu(self, chat_id: str, anchor: QPoint):
+        """显示文件夹菜单（复用同一个菜单实例，内容在显示前重建）"""
+        self._folder_menu_chat_id = chat_id
+        self._folder_menu.exec(anchor)
+    
+    def _rebuild_folder_menu(self):
+        """根据当前会话重建文件夹菜单项"""
+        menu = self._folder_menu
+        menu.clear()
+        chat_id = self._folder_menu_chat_id
         
         # 获取所有文件夹和当前聊天记录所在的文件夹
-        folders = self.folder_service.list_folders()
-        current_folders = self.folder_service.get_chat_folders(chat_id)
+        folders = self._cached_folders()
+        current_folders = self._chat_to_folders.get(chat_id, set())
         
         for folder in folders:
             folder_id = folder["id"]
             folder_name = folder["name"]
             is_in_folder = folder_id in current_folders
             
-            action = QAction(folder_name, self)
+            # 文件夹ID记录在动作上，由菜单统一分发，无需为每个动作创建闭包
+            action = QAction(folder_name, menu)
             action.setCheckable(True)
             action.setChecked(is_in_folder)
-            action.triggered.connect(lambda checked, fid=folder_id: self._toggle_folder(chat_id, fid))
+            action.setData(folder_id)
             menu.addAction(action)
         
         # 如果没有文件夹，添加提示
         if not folders:
-            action = QAction("暂无文件夹", self)
+            action = QAction("暂无文件夹", menu)
             action.setEnabled(False)
             menu.addAction(action)
-        
-        # 显示菜单
-        menu.exec(button.mapToGlobal(button.rect().bottomLeft()))
+    
+    def _on_folder_action_triggered(self, action: QAction):
+        """文件夹菜单的统一处理槽"""
+        folder_id = action.data()
+        if folder_id is not None and self._folder_menu_chat_id:
+            self._toggle_folder(self._folder_menu_chat_id, folder_id)
+    
+    def _cached_folders(self, ttl: float = 2.0) -> List[Dict]:
+        """获取文件夹列表，ttl 秒内复用上次读取的结果，避免每次点击都读盘"""
+        now = time.monotonic()
+        if not self._folders_cache or now - self._folders_cache[0] > ttl:
+            self._folders_cache = (now, self.folder_service.list_folders())
+        return self._folders_cache[1]
     
     def _toggle_folder(self, chat_id: str, folder_id: str):
         """切换文件夹状态"""
-        current_folders = self.folder_service.get_chat_folders(chat_id)
+        self._folders_cache = None
+        current_folders = self._chat_to_folders.setdefault(chat_id, set())
         
         if folder_id in current_folders:
             self.folder_service.remove_chat_from_folder(folder_id, chat_id)
+            current_folders.discard(folder_id)
         else:
             self.folder_service.add_chat_to_folder(folder_id, chat_id)
+            current_folders.add(folder_id)
         
         # 使用增量更新，而不是全量刷新
         self._update_chat_item(chat_id)
     
     def _toggle_star(self, chat_id: str):
         """切换星标状态"""
-        current_folders = self.folder_service.get_chat_folders(chat_id)
-        is_starred = "starred" in current_folders
+        current_folders = self._chat_to_folders.setdefault(chat_id, set())
         
-        if is_starred:
+        if "starred" in current_folders:
             self.folder_service.remove_chat_from_folder("starred", chat_id)
+            current_folders.discard("starred")
         else:
             self.folder_service.add_chat_to_folder("starred", chat_id)
+            current_folders.add("starred")
         
         # 使用增量更新，而不是全量刷新
         self._update_chat_item(chat_id)
     
     def _show_context_menu(self, position):
         """显示右键菜单"""
-        item = self.tree.itemAt(position)
-        if not item:
+        index = self.tree.indexAt(position).siblingAtColumn(0)
+        if not index.isValid():
             return
         
-        item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-        item_id = item.data(0, Qt.ItemDataRole.UserRole)
+        item_type = index.data(Qt.ItemDataRole.UserRole + 1)
+        item_id = index.data(Qt.ItemDataRole.UserRole)
         
         menu = QMenu(self)
         
@@ -505,16 +833,18 @@ class ChatHistoryManager(QWidget):
             menu.addAction(delete_action)
         
         if menu.actions():
-            menu.exec(self.tree.mapToGlobal(position))
+            menu.exec(self.tree.viewport().mapToGlobal(position))
     
     def _create_folder(self):
         """创建新文件夹"""
         dialog = RenameDialog(self, "新建文件夹")
         if dialog.exec() == QDialog.DialogCode.Accepted and dialog.get_name():
             folder_name = dialog.get_name()
-            self.folder_service.create_folder(folder_name)
-            # 创建文件夹需要全量刷新，因为要添加新的顶级项
-            self.refresh_history()
+            folder_id = self.folder_service.create_folder(folder_name)
+            self._folders_cache = None
+            self._last_sig = None
+            # 只插入新的顶级项（放在“未分类”之前），无需全量刷新
+            self.model.insert_folder(self.model.rowCount() - 1, folder_id, folder_name)
     
     def _rename_folder(self, folder_id: str):
         """重命名文件夹"""
@@ -522,8 +852,10 @@ class ChatHistoryManager(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted and dialog.get_name():
             new_name = dialog.get_name()
             if self.folder_service.rename_folder(folder_id, new_name):
-                # 文件夹重命名需要全量刷新，因为要更新顶级项文本
-                self.refresh_history()
+                self._folders_cache = None
+                self._last_sig = None
+                # 只更新顶级项文本
+                self.model.rename_folder(folder_id, new_name)
     
     def _delete_folder(self, folder_id: str):
         """删除文件夹"""
@@ -537,8 +869,17 @@ class ChatHistoryManager(QWidget):
         
         if reply == QMessageBox.StandardButton.Yes:
             if self.folder_service.delete_folder(folder_id):
-                # 删除文件夹需要全量刷新，因为要移除顶级项
-                self.refresh_history()
+                self._folders_cache = None
+                self._last_sig = None
+                # 不再属于任何文件夹的会话移到“未分类”，然后移除该顶级项
+                orphans = []
+                for conv in self.model.folder_chats(folder_id):
+                    chat_folders = self._chat_to_folders.get(conv.id, set())
+                    chat_folders.discard(folder_id)
+                    if not chat_folders:
+                        orphans.append(conv)
+                self.model.remove_folder(folder_id)
+                self.model.append_chats("uncategorized", orphans)
 
 
 class RenameDialog(QDialog):
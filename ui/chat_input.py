@@ -3,22 +3,61 @@
 集成多模态文件上传功能，支持拖拽/选择/URL采集
 """
 import sys
+from collections import Counter
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QTextEdit, QLabel, QSplitter, QGroupBox
 )
-from PySide6.QtCore import Qt, Signal
-from PySide6.QtGui import QShortcut, QKeySequence, QKeyEvent
+from PySide6.QtCore import Qt, Signal, Slot, QTimer, QRegularExpression
+from PySide6.QtGui import QKeyEvent, QTextDocument
 
 # 添加项目根目录到路径
 current_dir = Path(__file__).parent.parent
 sys.path.append(str(current_dir))
 
 from services.file_upload_service import ProcessedFile
-from ui.file_upload_widget import EnhancedFileUploadWidget
+from ui.file_upload_widget import EnhancedFileUploadWidget, TYPE_ICONS
+
+
+# 输入区域样式表，在 EnhancedChatInput 上设置一次，子控件按对象名匹配
+CHAT_INPUT_QSS = """
+    QLabel#FileCountLabel {
+        color: #666;
+        font-size: 12px;
+    }
+    QLabel#FileCountLabel[hasFiles="true"] {
+        color: #007ACC;
+        font-weight: bold;
+    }
+    QPushButton#SendButton {
+        background-color: #007ACC;
+        color: white;
+        border: none;
+        border-radius: 5px;
+        font-weight: bold;
+    }
+    QPushButton#SendButton:hover {
+        background-color: #005A9E;
+    }
+    QPushButton#SendButton:pressed {
+        background-color: #004578;
+    }
+    QPushButton#SendButton:disabled {
+        background-color: #ccc;
+        color: #666;
+    }
+"""
+
+# 启用Unicode属性，使全角空格等与 str.strip() 一样视为空白
+_NON_SPACE_RE = QRegularExpression(r"\S", QRegularExpression.PatternOption.UseUnicodePropertiesOption)
+
+
+def _has_nonspace(doc: QTextDocument) -> bool:
+    """文档中是否有非空白字符（在文档内部查找，找到第一个即返回，不取出全文）"""
+    return not doc.find(_NON_SPACE_RE).isNull()
 
 
 class MessageTextEdit(QTextEdit):
@@ -43,18 +82,31 @@ class MessageTextEdit(QTextEdit):
         else:
             # 其他按键正常处理
             super().keyPressEvent(event)
+    
+    def is_effectively_empty(self) -> bool:
+        """是否没有可发送的文本（空文档时不取出全文）"""
+        return self.document().characterCount() <= 1 or not _has_nonspace(self.document())
 
 
 class EnhancedChatInput(QWidget):
     """增强聊天输入组件，支持多模态文件上传"""
     
-    send_message = Signal(str, list)  # 消息内容, ProcessedFile列表
+    # 消息内容, ProcessedFile元组（发送时的只读快照；object类型原样传递，不经QVariantList复制）
+    send_message = Signal(str, object)
     
     def __init__(self, api_key: Optional[str] = None, parent=None):
         super().__init__(parent)
         self.api_key = api_key
         self.processed_files: List[ProcessedFile] = []
         
+        # 文件统计（增量维护）：已统计的文件、总大小、各类型数量
+        self._counted_files: List[ProcessedFile] = []
+        self._total_size: int = 0
+        self._type_counts: Counter = Counter()
+        
+        # 发送按钮上次应用的状态 (有文本, 有文件)，状态不变时跳过更新
+        self._send_btn_state = None
+        
         self.setup_ui()
         self.connect_signals()
     
@@ -62,6 +114,7 @@ class EnhancedChatInput(QWidget):
         """设置UI"""
         layout = QVBoxLayout(self)
         layout.setContentsMargins(5, 5, 5, 5)
+        self.setStyleSheet(CHAT_INPUT_QSS)
         
         # 创建可收缩的上传区域
         self.create_upload_section(layout)
@@ -80,7 +133,7 @@ class EnhancedChatInput(QWidget):
         self.toggle_upload_btn.setToolTip("显示/隐藏文件上传区域")
         
         self.file_count_label = QLabel("无文件")
-        self.file_count_label.setStyleSheet("color: #666; font-size: 12px;")
+        self.file_count_label.setObjectName("FileCountLabel")
         
         toggle_layout.addWidget(self.toggle_upload_btn)
         toggle_layout.addWidget(self.file_count_label)
@@ -113,27 +166,9 @@ class EnhancedChatInput(QWidget):
         
         # 发送按钮
         self.send_btn = QPushButton("发送")
+        self.send_btn.setObjectName("SendButton")
         self.send_btn.setMaximumWidth(80)
         self.send_btn.setMinimumHeight(40)
-        self.send_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #007ACC;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #005A9E;
-            }
-            QPushButton:pressed {
-                background-color: #004578;
-            }
-            QPushButton:disabled {
-                background-color: #ccc;
-                color: #666;
-            }
-        """)
         
         input_layout.addWidget(self.text_edit, 1)
         input_layout.addWidget(self.send_btn, 0)
@@ -148,24 +183,25 @@ class EnhancedChatInput(QWidget):
         # 文件上传完成
         self.upload_widget.files_processed.connect(self.on_files_processed)
         
-        # 发送按钮和快捷键
+        # 发送按钮
         self.send_btn.clicked.connect(self.send_current_message)
         
-        # Enter键发送消息
+        # Enter键（含Ctrl+Enter）发送消息
         self.text_edit.send_message_requested.connect(self.send_current_message)
         
-        # Ctrl+Enter 快捷键（保留作为备选）
-        send_shortcut = QShortcut(QKeySequence("Ctrl+Return"), self.text_edit)
-        send_shortcut.activated.connect(self.send_current_message)
-        
-        # 文本变化时更新发送按钮状态
-        self.text_edit.textChanged.connect(self.update_send_button)
+        # 文本变化时更新发送按钮状态（防抖，连续输入只更新一次）
+        self._send_btn_timer = QTimer(self)
+        self._send_btn_timer.setSingleShot(True)
+        self._send_btn_timer.setInterval(50)
+        self._send_btn_timer.timeout.connect(self.update_send_button)
+        self.text_edit.textChanged.connect(self._send_btn_timer.start)
         
         # 支持拖拽到文本框
         self.text_edit.setAcceptDrops(True)
         self.text_edit.dragEnterEvent = self.drag_enter_event
         self.text_edit.dropEvent = self.drop_event
     
+    @Slot()
     def toggle_upload_area(self):
         """切换上传区域显示/隐藏"""
         is_visible = self.upload_widget.isVisible()
@@ -180,50 +216,67 @@ class EnhancedChatInput(QWidget):
         else:
             self.toggle_upload_btn.setText("📎 文件/URL")
     
+    @Slot(list)
     def on_files_processed(self, processed_files: List[ProcessedFile]):
         """文件处理完成"""
         self.processed_files = processed_files
         self.update_file_count_display()
     
+    def _update_file_stats(self, files: List[ProcessedFile]):
+        """增量更新文件统计：只在列表末尾追加时只统计新增文件，否则整体重算"""
+        counted = len(self._counted_files)
+        if len(files) >= counted and files[:counted] == self._counted_files:
+            added = files[counted:]
+        else:
+            self._counted_files = []
+            self._total_size = 0
+            self._type_counts.clear()
+            added = files
+        
+        for f in added:
+            self._total_size += f.file_size
+            self._type_counts[f.attachment_type] += 1
+        self._counted_files.extend(added)
+    
     def update_file_count_display(self):
         """更新文件数量显示"""
+        self._update_file_stats(self.processed_files)
         count = len(self.processed_files)
+        self._set_file_count_highlight(count > 0)
         if count == 0:
             self.file_count_label.setText("无文件")
-            self.file_count_label.setStyleSheet("color: #666; font-size: 12px;")
         else:
-            total_size = sum(f.file_size for f in self.processed_files)
-            size_mb = total_size / 1024 / 1024
-            
-            # 统计类型
-            type_counts = {}
-            for f in self.processed_files:
-                type_name = f.attachment_type.value
-                type_counts[type_name] = type_counts.get(type_name, 0) + 1
+            size_mb = self._total_size / 1024 / 1024
             
             # 构建显示文本
-            type_text = []
-            type_icons = {
-                'DOCUMENT': '📄',
-                'IMAGE': '🖼️', 
-                'VIDEO': '🎥',
-                'AUDIO': '🎵',
-                'OTHER': '📎'
-            }
-            
-            for type_name, type_count in type_counts.items():
-                icon = type_icons.get(type_name, '📎')
-                type_text.append(f"{icon}{type_count}")
+            type_text = [
+                f"{TYPE_ICONS.get(attachment_type, '📎')}{type_count}"
+                for attachment_type, type_count in self._type_counts.items()
+            ]
             
             display_text = f"{count}个文件 ({size_mb:.1f}MB) - {' '.join(type_text)}"
             self.file_count_label.setText(display_text)
-            self.file_count_label.setStyleSheet("color: #007ACC; font-size: 12px; font-weight: bold;")
     
+    def _set_file_count_highlight(self, has_files: bool):
+        """切换文件数量标签的高亮样式，只在状态变化时重新应用样式"""
+        if self.file_count_label.property("hasFiles") == has_files:
+            return
+        self.file_count_label.setProperty("hasFiles", has_files)
+        style = self.file_count_label.style()
+        style.unpolish(self.file_count_label)
+        style.polish(self.file_count_label)
+    
+    @Slot()
     def update_send_button(self):
         """更新发送按钮状态"""
-        has_text = bool(self.text_edit.toPlainText().strip())
+        has_text = not self.text_edit.is_effectively_empty()
         has_files = len(self.processed_files) > 0
         
+        state = (has_text, has_files)
+        if state == self._send_btn_state:
+            return
+        self._send_btn_state = state
+        
         # 有文本或文件时才能发送
         self.send_btn.setEnabled(has_text or has_files)
         
@@ -260,16 +313,19 @@ class EnhancedChatInput(QWidget):
         # 对于其他内容，让文本框正常处理
         super().dropEvent(event)
     
+    @Slot()
     def send_current_message(self):
         """发送当前消息"""
-        message_text = self.text_edit.toPlainText().strip()
-        
-        # 检查是否有内容可发送
-        if not message_text and not self.processed_files:
-            return
+        # 检查是否有内容可发送（确实要发送时才取出全文）
+        if self.text_edit.is_effectively_empty():
+            if not self.processed_files:
+                return
+            message_text = ""
+        else:
+            message_text = self.text_edit.toPlainText().strip()
         
         # 发出信号
-        self.send_message.emit(message_text, self.processed_files.copy())
+        self.send_message.emit(message_text, tuple(self.processed_files))
         
         # 清空输入
         self.clear_input()
@@ -279,10 +335,16 @@ class EnhancedChatInput(QWidget):
         self.text_edit.clear()
         # 注意：不清空文件，让用户手动控制
     
+    @property
+    def file_service(self):
+        """上传组件使用的文件上传服务（聊天标签页复用，不再另建客户端）"""
+        return self.upload_widget.file_upload_service
+    
     def clear_files(self):
         """清空文件"""
         self.upload_widget.clear_all_files()
         self.processed_files.clear()
+        self.file_service.clear_parts_cache()
         self.update_file_count_display()
         self.update_send_button()
     
@@ -291,7 +353,7 @@ class EnhancedChatInput(QWidget):
         self.text_edit.setEnabled(enabled)
         
         if enabled:
-            has_content = bool(self.text_edit.toPlainText().strip() or self.processed_files)
+            has_content = not self.text_edit.is_effectively_empty() or bool(self.processed_files)
             self.send_btn.setEnabled(has_content)
         else:
             self.send_btn.setEnabled(False)
@@ -299,9 +361,9 @@ class EnhancedChatInput(QWidget):
         self.toggle_upload_btn.setEnabled(enabled)
         self.upload_widget.setEnabled(enabled)
     
-    def get_processed_files(self) -> List[ProcessedFile]:
-        """获取已处理的文件列表"""
-        return self.processed_files.copy()
+    def get_processed_files(self) -> Tuple[ProcessedFile, ...]:
+        """获取已处理文件的只读快照"""
+        return tuple(self.processed_files)
     
     def get_gemini_parts(self) -> List:
         """获取用于Gemini API的内容部分"""
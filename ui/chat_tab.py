@@ -3,50 +3,79 @@
 集成多模态文件上传功能的完整聊天界面
 """
 import sys
-import asyncio
+import collections
+import concurrent.futures
+import itertools
+import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Sequence
 from datetime import datetime
 
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QScrollArea,
-    QLabel, QPushButton, QFrame, QSplitter, QMessageBox
+    QWidget, QVBoxLayout, QHBoxLayout, QListView, QAbstractItemView,
+    QLabel, QPushButton, QFrame, QSplitter, QMessageBox, QMenu,
+    QStyledItemDelegate, QApplication
 )
-from PySide6.QtCore import Qt, Signal, QThread, QTimer
-from PySide6.QtGui import QFont, QTextCursor
+from PySide6.QtCore import (
+    Qt, Signal, Slot, QObject, QTimer, QSize, QRectF, QPointF, QEvent,
+    QAbstractListModel, QModelIndex
+)
+from PySide6.QtGui import QFont, QFontMetrics, QColor, QPainter, QStaticText, QTextLayout, QTextOption, QTransform
 
 # 添加项目根目录到路径
 current_dir = Path(__file__).parent.parent
 sys.path.append(str(current_dir))
 
-from services.file_upload_service import ProcessedFile
+from services.file_upload_service import ProcessedFile, FileUploadService
+from ui.async_runner import get_async_runner
 from ui.chat_input import EnhancedChatInput
 from ui.ui_config import Conversation, SimpleGeminiService
 
+logger = logging.getLogger(__name__)
+
 
-class MultimodalAsyncWorker(QThread):
-    """支持多模态的异步工作线程"""
+class MultimodalAsyncWorker(QObject):
+    """支持多模态的异步任务，在共享的事件循环线程中执行
+    
+    信号从事件循环线程发射，经队列连接回到UI线程
+    """
     
-    stream_chunk = Signal(str)
     response_received = Signal(str)  
     error_occurred = Signal(str)
+    finished = Signal()
     
-    def __init__(self, service, user_message: str, conversation, processed_files: Optional[List[ProcessedFile]] = None, streaming: bool = True, api_key: Optional[str] = None):
+    def __init__(self, service, user_message: str, conversation, processed_files: Sequence[ProcessedFile] = (), streaming: bool = True, file_service: Optional[FileUploadService] = None,
+                 on_chunk: Optional[Callable[[str], None]] = None):
         super().__init__()
         self.service = service
         self.user_message = user_message
         self.conversation = conversation
-        self.processed_files = processed_files or []
+        self.processed_files = processed_files  # 只读快照，不再复制
         self.streaming = streaming
-        self.api_key = api_key
+        self.file_service = file_service
+        # 流式块直接交给该回调（需线程安全，如 deque.append），由UI线程定时取出，不走跨线程信号
+        if streaming and on_chunk is None:
+            raise ValueError("流式模式需要提供 on_chunk 回调")
+        self.on_chunk = on_chunk
         
-    def run(self):
+        self._future: Optional[concurrent.futures.Future] = None
+    
+    def start(self):
+        """把任务投递到共享的事件循环线程"""
+        self._future = get_async_runner().submit(self._run())
+    
+    async def _run(self):
         """执行任务"""
         try:
+            if self.processed_files:
+                # 多批附件一起发送时可能超出内联预算，超出部分先上传File API
+                await self.file_service.upload_over_inline_budget(self.processed_files)
+            payload = self._build_payload()
             if self.streaming:
-                asyncio.run(self._stream_message_with_files())
+                await self._stream_message_with_files(payload)
             else:
-                asyncio.run(self._send_message_with_files())
+                await self._send_message_with_files(payload)
         except Exception as e:
             print(f"MultimodalAsyncWorker异常: {e}")
             import traceback
@@ -54,33 +83,37 @@ class MultimodalAsyncWorker(QThread):
             self.error_occurred.emit(str(e))
         finally:
             print("MultimodalAsyncWorker完成")
+            self.finished.emit()
+    
+    def _build_payload(self) -> Any:
+        """准备发送内容：无内容时为空字符串，只有一部分时为该部分，否则为列表"""
+        content_parts = []
+        
+        # 添加文本内容
+        if self.user_message:
+            content_parts.append(self.user_message)
+        
+        # 添加文件引用 - 转换为Gemini格式（仅当有文件时）
+        if self.processed_files:
+            # 同一组附件重复发送时复用已生成的内容部分
+            content_parts.extend(self.file_service.create_gemini_parts_cached(self.processed_files))
+        
+        if not content_parts:
+            return ""
+        return content_parts if len(content_parts) > 1 else content_parts[0]
                     
-    async def _send_message_with_files(self):
+    async def _send_message_with_files(self, payload: Any):
         """发送非流式消息（带文件）"""
         try:
-            print(f"开始发送非流式消息（带文件）: {self.user_message}")
-            
-            # 准备内容 - 支持文件
-            content_parts = []
-            
-            # 添加文本内容
-            if self.user_message:
-                content_parts.append(self.user_message)
-            
-            # 添加文件引用 - 转换为Gemini格式（仅当有文件时）
-            if self.processed_files:
-                from services.file_upload_service import get_file_upload_service
-                file_service = get_file_upload_service(self.api_key)
-                gemini_parts = file_service.create_gemini_parts(self.processed_files)
-                content_parts.extend(gemini_parts)
+            logger.debug("开始发送非流式消息（带文件）: %s", self.user_message)
             
             # 发送消息
             assistant_message, updated_conversation = await self.service.send_message_async(
-                content=content_parts if len(content_parts) > 1 else content_parts[0] if content_parts else "",
+                content=payload,
                 conversation=self.conversation,
                 streaming=False
             )
-            print(f"收到助手回复: {assistant_message.content[:100]}...")
+            logger.debug("收到助手回复: %d 字符", len(assistant_message.content))
             self.response_received.emit(assistant_message.content)
         except Exception as e:
             print(f"_send_message_with_files异常: {e}")
@@ -88,34 +121,23 @@ class MultimodalAsyncWorker(QThread):
             print(f"错误堆栈: {traceback.format_exc()}")
             self.error_occurred.emit(str(e))
             
-    async def _stream_message_with_files(self):
+    async def _stream_message_with_files(self, payload: Any):
         """发送流式消息（带文件）"""
         try:
-            print(f"开始发送流式消息（带文件）: {self.user_message}")
-            
-            # 准备内容 - 支持文件
-            content_parts = []
-            
-            # 添加文本内容
-            if self.user_message:
-                content_parts.append(self.user_message)
-            
-            # 添加文件引用 - 转换为Gemini格式（仅当有文件时）
-            if self.processed_files:
-                from services.file_upload_service import get_file_upload_service
-                file_service = get_file_upload_service(self.api_key)
-                gemini_parts = file_service.create_gemini_parts(self.processed_files)
-                content_parts.extend(gemini_parts)
+            logger.debug("开始发送流式消息（带文件）: %s", self.user_message)
             
+            # 逐块日志只在启用DEBUG时记录，关闭时循环内没有格式化和输出开销
+            log_chunks = logger.isEnabledFor(logging.DEBUG)
             chunk_count = 0
             async for chunk, updated_conversation in self.service.send_message_stream_async(
-                content=content_parts if len(content_parts) > 1 else content_parts[0] if content_parts else "",
+                content=payload,
                 conversation=self.conversation
             ):
                 chunk_count += 1
-                print(f"收到流式块 {chunk_count}: {chunk[:50]}...")
-                self.stream_chunk.emit(chunk)
-            print(f"流式消息完成，共收到 {chunk_count} 个块")
+                if log_chunks:
+                    logger.debug("收到流式块 %d: %d 字符", chunk_count, len(chunk))
+                self.on_chunk(chunk)
+            logger.debug("流式消息完成，共收到 %d 个块", chunk_count)
         except Exception as e:
             print(f"_stream_message_with_files异常: {e}")
             import traceback
@@ -123,6 +145,240 @@ class MultimodalAsyncWorker(QThread):
             self.error_occurred.emit(str(e))
 
 
+@lru_cache(maxsize=1)
+def _bubble_fonts() -> Dict[str, QFont]:
+    """气泡使用的字体（所有标签页共享同一份，需在QApplication创建后调用）"""
+    sender_font = QFont()
+    sender_font.setBold(True)
+    sender_font.setPointSize(10)
+    content_font = QFont()
+    content_font.setPointSize(11)
+    time_font = QFont()
+    time_font.setPixelSize(10)
+    return {"sender": sender_font, "content": content_font, "time": time_font}
+
+
+class ChatModel(QAbstractListModel):
+    """聊天消息列表模型，每行为 {"id", "sender", "content", "timestamp"}"""
+    
+    MessageRole = Qt.ItemDataRole.UserRole + 1
+    
+    _ids = itertools.count(1)  # 行的稳定ID，供委托按行缓存文本布局
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[Dict[str, Any]] = []
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == self.MessageRole:
+            return row
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row["content"]
+        return None
+    
+    def append_row(self, sender: str, content: str) -> int:
+        """追加一条消息，返回行号"""
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.append({
+            "id": next(self._ids),
+            "sender": sender,
+            "content": content,
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+        })
+        self.endInsertRows()
+        return row
+    
+    def append_text(self, row: int, delta: str):
+        """向指定行的内容末尾追加文本（流式回复）"""
+        if not 0 <= row < len(self._rows) or not delta:
+            return
+        self._rows[row]["content"] += delta
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+    
+    def clear(self):
+        """清空所有消息（整体重置，视图一次性丢弃所有行）"""
+        if not self._rows:
+            return
+        self.beginResetModel()
+        self._rows.clear()
+        self.endResetModel()
+
+
+class ChatBubbleDelegate(QStyledItemDelegate):
+    """把消息绘制为气泡，只有可见行才会被布局和绘制
+    
+    视图每插入一行都会对所有行重新调用 sizeHint，因此行尺寸按行号缓存，
+    命中时不经过 index.data()；ChatModel 只在末尾追加，已有行的行号不会变化。
+    行高由一个共享的 QTextLayout 测量，只有绘制过的行才保留 QStaticText
+    """
+    
+    RADIUS = 10
+    PADDING = 10
+    OUTER_MARGIN = 10  # 气泡靠近的一侧
+    INNER_MARGIN = 50  # 气泡远离的一侧
+    BOTTOM_MARGIN = 5
+    LINE_GAP = 4
+    WIDTH_BUCKET = 16  # 文本宽度按16px取整，拖动窗口时不会每个像素都重新排版
+    MAX_CACHED_TEXTS = 256  # 最多保留多少行的 QStaticText
+    
+    STYLES = {
+        "user": {"background": QColor("#007ACC"), "text": QColor("white"), "sender": QColor("#cce6ff")},
+        "assistant": {"background": QColor("#f0f0f0"), "text": QColor("black"), "sender": QColor("#666")},
+    }
+    TIME_COLOR = QColor("#888")
+    
+    def __init__(self, model: ChatModel, view: QListView):
+        super().__init__(view)
+        fonts = _bubble_fonts()
+        self.sender_font = fonts["sender"]
+        self.content_font = fonts["content"]
+        self.time_font = fonts["time"]
+        self._sender_height = QFontMetrics(self.sender_font).height()
+        self._time_height = QFontMetrics(self.time_font).height()
+        self._text_option = QTextOption()
+        self._text_option.setWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere)
+        
+        # 测量行高用的共享布局，不为屏幕外的行保留排版结果
+        self._measure_layout = QTextLayout("", self.content_font)
+        self._measure_layout.setTextOption(self._text_option)
+        
+        # 行ID -> {取整后的文本宽度: QStaticText}，按最近绘制顺序淘汰
+        self._layout_cache: "collections.OrderedDict[int, Dict[int, QStaticText]]" = collections.OrderedDict()
+        # 行号 -> 当前视图宽度下的行尺寸
+        self._size_cache: Dict[int, QSize] = {}
+        
+        # 视图宽度由视口的尺寸变化事件维护，sizeHint 中不再逐行查询
+        self._view_width = view.viewport().width()
+        view.viewport().installEventFilter(self)
+        
+        model.dataChanged.connect(self._on_data_changed)
+        model.rowsRemoved.connect(self._clear_caches)
+        model.modelReset.connect(self._clear_caches)
+    
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Resize and event.size().width() != self._view_width:
+            self._view_width = event.size().width()
+            self._size_cache.clear()
+        return super().eventFilter(watched, event)
+    
+    def _clear_caches(self, *args):
+        self._layout_cache.clear()
+        self._size_cache.clear()
+    
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        """内容变化的行丢弃缓存的布局，并通知视图重新计算行高"""
+        model = top_left.model()
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            index = model.index(row, 0)
+            self._layout_cache.pop(index.data(ChatModel.MessageRole)["id"], None)
+            self._size_cache.pop(row, None)
+            self.sizeHintChanged.emit(index)
+    
+    def _bubble_rect(self, rect, sender: str):
+        left, right = ((self.INNER_MARGIN, self.OUTER_MARGIN) if sender == "user"
+                       else (self.OUTER_MARGIN, self.INNER_MARGIN))
+        return QRectF(rect).adjusted(left, 0, -right, -self.BOTTOM_MARGIN)
+    
+    def _text_width(self, view_width: int) -> int:
+        width = view_width - self.OUTER_MARGIN - self.INNER_MARGIN - 2 * self.PADDING
+        return max(self.WIDTH_BUCKET, width - width % self.WIDTH_BUCKET)
+    
+    @staticmethod
+    def _display_text(message: Dict[str, Any]) -> str:
+        # 纯文本排版时 \n 不会换行，换成行分隔符
+        return message["content"].replace("\n", "\u2028")
+    
+    def _content_height(self, message: Dict[str, Any], width: int) -> float:
+        """用共享的 QTextLayout 测量消息内容折行后的高度"""
+        layout = self._measure_layout
+        layout.setText(self._display_text(message))
+        height = 0.0
+        layout.beginLayout()
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(width)
+            height += line.height()
+        layout.endLayout()
+        return height
+    
+    def _content_text(self, message: Dict[str, Any], width: int) -> QStaticText:
+        """获取排版好的消息内容，按 (行ID, 宽度) 缓存，绘制时不再重新折行"""
+        by_width = self._layout_cache.get(message["id"])
+        if by_width is None:
+            by_width = self._layout_cache[message["id"]] = {}
+            if len(self._layout_cache) > self.MAX_CACHED_TEXTS:
+                self._layout_cache.popitem(last=False)
+        else:
+            self._layout_cache.move_to_end(message["id"])
+        
+        static_text = by_width.get(width)
+        if static_text is None:
+            static_text = by_width[width] = QStaticText(self._display_text(message))
+            static_text.setTextFormat(Qt.TextFormat.PlainText)
+            static_text.setTextOption(self._text_option)
+            static_text.setTextWidth(width)
+            static_text.prepare(QTransform(), self.content_font)
+        return static_text
+    
+    def sizeHint(self, option, index):
+        size = self._size_cache.get(index.row())
+        if size is None:
+            message = index.data(ChatModel.MessageRole)
+            content_height = self._content_height(message, self._text_width(self._view_width))
+            height = (2 * self.PADDING + self._sender_height + self.LINE_GAP + content_height
+                      + self.LINE_GAP + self._time_height + self.BOTTOM_MARGIN)
+            size = self._size_cache[index.row()] = QSize(self._view_width, int(height) + 1)
+        return size
+    
+    def paint(self, painter, option, index):
+        message = index.data(ChatModel.MessageRole)
+        style = self.STYLES.get(message["sender"], self.STYLES["assistant"])
+        bubble = self._bubble_rect(option.rect, message["sender"])
+        
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(style["background"])
+        painter.drawRoundedRect(bubble, self.RADIUS, self.RADIUS)
+        
+        x = bubble.left() + self.PADDING
+        y = bubble.top() + self.PADDING
+        text_width = bubble.width() - 2 * self.PADDING
+        
+        # 发送者
+        painter.setFont(self.sender_font)
+        painter.setPen(style["sender"])
+        painter.drawText(QRectF(x, y, text_width, self._sender_height),
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         "👤 您" if message["sender"] == "user" else "🤖 Gemini")
+        y += self._sender_height + self.LINE_GAP
+        
+        # 消息内容
+        static_text = self._content_text(message, self._text_width(self._view_width))
+        painter.setFont(self.content_font)
+        painter.setPen(style["text"])
+        painter.drawStaticText(QPointF(x, y), static_text)
+        y += static_text.size().height() + self.LINE_GAP
+        
+        # 时间戳
+        painter.setFont(self.time_font)
+        painter.setPen(self.TIME_COLOR)
+        painter.drawText(QRectF(x, y, text_width, self._time_height),
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         message["timestamp"])
+        painter.restore()
+
+
 class EnhancedChatTab(QWidget):
     """增强聊天标签页，支持多模态输入"""
     
@@ -136,6 +392,12 @@ class EnhancedChatTab(QWidget):
         self.current_worker = None
         self.current_response_parts = []
         
+        # 工作线程把流式块放入队列，UI线程按固定节奏统一取出显示
+        self._chunk_queue = collections.deque()
+        self._chunk_timer = QTimer(self)
+        self._chunk_timer.setInterval(33)
+        self._chunk_timer.timeout.connect(self._drain_chunk_queue)
+        
         # 加载用户设置
         from geminichat.domain.user_settings import UserSettings
         self.user_settings = UserSettings.load()
@@ -158,20 +420,22 @@ class EnhancedChatTab(QWidget):
     
     def create_chat_display(self, parent_layout: QVBoxLayout):
         """创建聊天显示区域"""
-        # 聊天历史滚动区域
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy(1))  # AlwaysOff
-        self.scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy(0))  # AsNeeded
-        
-        # 聊天内容容器
-        self.chat_content = QWidget()
-        self.chat_layout = QVBoxLayout(self.chat_content)
-        self.chat_layout.setSpacing(10)
-        self.chat_layout.addStretch()  # 添加弹簧，让消息从底部开始
-        
-        self.scroll_area.setWidget(self.chat_content)
-        parent_layout.addWidget(self.scroll_area, 1)  # 占据大部分空间
+        # 聊天历史列表（只布局和绘制可见的消息）
+        self.chat_model = ChatModel(self)
+        self.chat_view = QListView()
+        self.chat_view.setModel(self.chat_model)
+        self.chat_view.setItemDelegate(ChatBubbleDelegate(self.chat_model, self.chat_view))
+        self.chat_view.setUniformItemSizes(False)
+        self.chat_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.chat_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.chat_view.setSpacing(5)
+        self.chat_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.chat_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.chat_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.chat_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.chat_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.chat_view.customContextMenuRequested.connect(self._show_message_menu)
+        parent_layout.addWidget(self.chat_view, 1)  # 占据大部分空间
         
         # 添加欢迎消息
         self.add_welcome_message()
@@ -187,6 +451,9 @@ class EnhancedChatTab(QWidget):
         # 增强聊天输入
         self.chat_input = EnhancedChatInput(self.api_key, self)
         parent_layout.addWidget(self.chat_input, 0)  # 固定高度
+        
+        # 复用输入组件的文件服务，发送消息时不再重新创建
+        self.file_service = self.chat_input.file_service
     
     def connect_signals(self):
         """连接信号"""
@@ -212,7 +479,8 @@ class EnhancedChatTab(QWidget):
         
         self.add_message("assistant", welcome_text, show_files=False)
     
-    def send_message_with_files(self, message_text: str, processed_files: List[ProcessedFile]):
+    @Slot(str, object)
+    def send_message_with_files(self, message_text: str, processed_files: Sequence[ProcessedFile]):
         """发送带文件的消息"""
         if not message_text.strip() and not processed_files:
             return
@@ -233,7 +501,7 @@ class EnhancedChatTab(QWidget):
         # 添加小延迟以确保服务完全初始化（特别是对新会话）
         QTimer.singleShot(100, lambda: self._send_message_delayed(message_text, processed_files, use_streaming))
         
-    def _send_message_delayed(self, message_text: str, processed_files: List[ProcessedFile], use_streaming: bool):
+    def _send_message_delayed(self, message_text: str, processed_files: Sequence[ProcessedFile], use_streaming: bool):
         """延迟发送消息，确保服务初始化完成"""
         # 创建并启动异步工作线程
         self.current_worker = MultimodalAsyncWorker(
@@ -242,13 +510,12 @@ class EnhancedChatTab(QWidget):
             self.conversation,
             processed_files,
             streaming=use_streaming,
-            api_key=self.api_key
+            file_service=self.file_service,
+            on_chunk=self._chunk_queue.append if use_streaming else None
         )
         
-        # 连接信号
-        if use_streaming:
-            self.current_worker.stream_chunk.connect(self.on_stream_chunk)
-        else:
+        # 连接信号（流式块经队列传递，不走跨线程信号）
+        if not use_streaming:
             self.current_worker.response_received.connect(self.on_response_received)
         self.current_worker.error_occurred.connect(self.on_error_occurred)
         self.current_worker.finished.connect(self.on_worker_finished)  # 添加finished信号连接
@@ -256,11 +523,13 @@ class EnhancedChatTab(QWidget):
         # 准备接收响应
         if use_streaming:
             self.current_response_parts = []
-            self.current_assistant_widget = None
+            self.current_assistant_row = None
+            self._chunk_queue.clear()
+            self._chunk_timer.start()
         
         self.current_worker.start()
     
-    def add_user_message(self, message_text: str, processed_files: List[ProcessedFile]):
+    def add_user_message(self, message_text: str, processed_files: Sequence[ProcessedFile]):
         """添加用户消息"""
         # 构建消息内容
         content_parts = []
@@ -281,18 +550,15 @@ class EnhancedChatTab(QWidget):
         
         self.add_message("user", full_content, show_files=len(processed_files) > 0)
     
-    def add_message(self, sender: str, content: str, show_files: bool = False):
-        """添加消息到聊天显示 - 改进版本，支持加载状态和优化渲染"""
-        # 1. 创建消息widget（优化性能）
-        message_widget = self.create_message_widget(sender, content, show_files)
-        
-        # 2. 使用批量插入避免频繁重绘
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, message_widget)
+    def add_message(self, sender: str, content: str, show_files: bool = False) -> int:
+        """添加消息到聊天显示，返回消息所在行"""
+        # 1. 追加到模型，视图只布局可见行
+        row = self.chat_model.append_row(sender, content)
         
-        # 3. 延迟滚动到底部，避免频繁滚动
+        # 2. 延迟滚动到底部，避免频繁滚动
         self._schedule_scroll_to_bottom()
         
-        return message_widget
+        return row
     
     def _schedule_scroll_to_bottom(self):
         """调度滚动到底部 - 避免频繁滚动"""
@@ -305,114 +571,64 @@ class EnhancedChatTab(QWidget):
         # 重启定时器
         self._scroll_timer.start(100)  # 100ms延迟
     
-    def create_message_widget(self, sender: str, content: str, show_files: bool = False) -> QWidget:
-        """创建消息widget"""
-        container = QFrame()
-        
-        if sender == "user":
-            container.setStyleSheet("""
-                QFrame {
-                    background-color: #007ACC;
-                    color: white;
-                    border-radius: 10px;
-                    padding: 10px;
-                    margin-left: 50px;
-                    margin-right: 10px;
-                    margin-bottom: 5px;
-                }
-            """)
-        else:  # assistant
-            container.setStyleSheet("""
-                QFrame {
-                    background-color: #f0f0f0;
-                    color: black;
-                    border-radius: 10px;
-                    padding: 10px;
-                    margin-left: 10px;
-                    margin-right: 50px;
-                    margin-bottom: 5px;
-                }
-            """)
-        
-        layout = QVBoxLayout(container)
-        layout.setContentsMargins(0, 0, 0, 0)
-        
-        # 发送者标签
-        sender_label = QLabel("👤 您" if sender == "user" else "🤖 Gemini")
-        sender_font = QFont()
-        sender_font.setBold(True)
-        sender_font.setPointSize(10)
-        sender_label.setFont(sender_font)
-        
-        if sender == "user":
-            sender_label.setStyleSheet("color: #cce6ff;")
-        else:
-            sender_label.setStyleSheet("color: #666;")
-        
-        layout.addWidget(sender_label)
-        
-        # 消息内容
-        content_label = QLabel(content)
-        content_label.setWordWrap(True)
-        content_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        
-        content_font = QFont()
-        content_font.setPointSize(11)
-        content_label.setFont(content_font)
-        
-        layout.addWidget(content_label)
-        
-        # 时间戳
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        time_label = QLabel(timestamp)
-        time_label.setStyleSheet("font-size: 10px; color: #888; margin-top: 5px;")
-        layout.addWidget(time_label)
-        
-        return container
-    
+    @Slot(str)
     def on_stream_chunk(self, chunk: str):
         """处理流式响应块"""
         self.current_response_parts.append(chunk)
         
-        # 如果还没有助手消息widget，创建一个
-        if self.current_assistant_widget is None:
-            self.current_assistant_widget = self.add_message("assistant", "", show_files=False)
+        # 如果还没有助手消息行，创建一个
+        if self.current_assistant_row is None:
+            self.current_assistant_row = self.add_message("assistant", "", show_files=False)
         
-        # 更新消息内容
-        full_content = "".join(self.current_response_parts)
-        self.update_message_content(self.current_assistant_widget, full_content)
+        # 只追加新到达的块，不重建整段文本
+        self.update_message_content(self.current_assistant_row, chunk)
         
         # 滚动到底部
         self.scroll_to_bottom()
     
-    def update_message_content(self, message_widget: QWidget, content: str):
-        """更新消息内容"""
-        # 找到内容标签并更新
-        layout = message_widget.layout()
-        if layout and layout.count() >= 2:
-            item = layout.itemAt(1)
-            if item:
-                content_label = item.widget()
-                if isinstance(content_label, QLabel):
-                    content_label.setText(content)
+    @Slot()
+    def _drain_chunk_queue(self):
+        """取出队列中已到达的全部流式块，合并后一次追加"""
+        if not self._chunk_queue:
+            return
+        parts = []
+        while self._chunk_queue:
+            parts.append(self._chunk_queue.popleft())
+        self.on_stream_chunk("".join(parts))
+    
+    def update_message_content(self, row: int, delta: str):
+        """向消息内容末尾追加文本"""
+        self.chat_model.append_text(row, delta)
     
+    def _show_message_menu(self, pos):
+        """消息右键菜单：复制消息内容"""
+        index = self.chat_view.indexAt(pos)
+        if not index.isValid():
+            return
+        menu = QMenu(self)
+        copy_action = menu.addAction("复制")
+        if menu.exec(self.chat_view.viewport().mapToGlobal(pos)) is copy_action:
+            QApplication.clipboard().setText(index.data(Qt.ItemDataRole.DisplayRole))
+    
+    @Slot(str)
     def on_response_received(self, response: str):
         """处理完整响应（非流式模式）"""
-        print(f"收到完整响应: {len(response)} 字符")
+        logger.debug("收到完整响应: %d 字符", len(response))
         
         # 直接显示完整回复
         self.add_message("assistant", response)
         
-        # 重新启用输入
+        # 重新启用输入（任务对象在 finished 信号到达后再释放）
         self.chat_input.set_enabled(True)
-        
-        # 清理工作线程
-        self.current_worker = None
     
+    @Slot(str)
     def on_error_occurred(self, error: str):
         """处理错误"""
         print(f"发生错误: {error}")
         
+        # 先显示出错前已收到的部分回复
+        self._drain_chunk_queue()
+        
         # 显示错误消息
         error_message = f"❌ 抱歉，发生了错误：\n{error}\n\n请检查网络连接或API配置。"
         self.add_message("assistant", error_message)
@@ -420,15 +636,19 @@ class EnhancedChatTab(QWidget):
         # 重新启用输入
         self.chat_input.set_enabled(True)
         
-        # 清理工作线程
-        self.current_worker = None
+        # 清理流式状态（任务对象在 finished 信号到达后再释放）
         self.current_response_parts = []
-        self.current_assistant_widget = None
+        self.current_assistant_row = None
     
+    @Slot()
     def on_worker_finished(self):
         """处理工作线程完成"""
         print("工作线程已完成")
         
+        # 停止取块定时器，显示剩余的块
+        self._chunk_timer.stop()
+        self._drain_chunk_queue()
+        
         # 重新启用输入组件
         self.chat_input.set_enabled(True)
         
@@ -436,13 +656,12 @@ class EnhancedChatTab(QWidget):
         self.current_worker = None
         if hasattr(self, 'current_response_parts'):
             self.current_response_parts = []
-        if hasattr(self, 'current_assistant_widget'):
-            self.current_assistant_widget = None
+        if hasattr(self, 'current_assistant_row'):
+            self.current_assistant_row = None
     
     def scroll_to_bottom(self):
         """滚动到底部"""
-        scrollbar = self.scroll_area.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        self.chat_view.scrollToBottom()
     
     def get_conversation(self) -> Conversation:
         """获取当前对话"""
@@ -477,26 +696,19 @@ class EnhancedChatTab(QWidget):
         
     def _clear_messages_batch(self):
         """批量清理消息"""
-        # 批量删除所有消息widget（保留弹簧）
-        widgets_to_remove = []
-        while self.chat_layout.count() > 1:  # 保留弹簧
-            child = self.chat_layout.takeAt(0)
-            if child and child.widget():
-                widgets_to_remove.append(child.widget())
-                
-        # 批量删除
-        for widget in widgets_to_remove:
-            widget.deleteLater()
+        # 一次性移除模型中的所有行
+        self.chat_model.clear()
             
     def _reset_conversation_state(self):
         """重置对话状态"""
         # 重置流式消息状态
-        if hasattr(self, 'current_assistant_widget'):
-            self.current_assistant_widget = None
+        if hasattr(self, 'current_assistant_row'):
+            self.current_assistant_row = None
         if hasattr(self, 'is_streaming'):
             self.is_streaming = False
         if hasattr(self, 'current_response_parts'):
             self.current_response_parts = []
+        self._chunk_queue.clear()
             
         # 重置滚动定时器
         if hasattr(self, '_scroll_timer'):
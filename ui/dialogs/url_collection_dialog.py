@@ -3,37 +3,162 @@ URL采集对话框
 支持多个URL输入，自动识别类型，提供预览功能
 """
 import re
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QTextEdit, QListWidget, QListWidgetItem, QProgressBar,
+    QPlainTextEdit, QListView, QProgressBar,
     QGroupBox, QScrollArea, QFrame, QSplitter, QMessageBox
 )
-from PySide6.QtCore import Qt, Signal, QThread, QTimer
-from PySide6.QtGui import QFont, QIcon
+from PySide6.QtCore import (
+    Qt, Signal, QObject, QRunnable, QThreadPool, QTimer, QAbstractListModel, QModelIndex,
+    QItemSelection, QItemSelectionModel
+)
+from PySide6.QtGui import QFont, QIcon, QTextCursor
+
+from services.file_upload_service import FileUploadService, URLInfo, parse_urls_from_text
+
+# 字节数换算为MB的系数
+_MB_INV = 1.0 / (1024 * 1024)
+
+# 输入超过该长度时在线程池中统计URL数量，避免大段粘贴时阻塞界面
+_BACKGROUND_PARSE_THRESHOLD = 64 * 1024
 
-from services.file_upload_service import URLInfo, parse_urls_from_text
+# URL类型显示名称
+_TYPE_NAME_MAP = {
+    'pdf': 'PDF文档',
+    'image': '图片',
+    'video': '视频',
+    'audio': '音频',
+    'youtube': 'YouTube',
+    'html': '网页'
+}
 
 
-class URLAnalysisWorker(QThread):
-    """URL分析工作线程"""
+def _emit_result(signal, *args):
+    """从线程池任务发出结果信号；对话框已关闭时信号对象已随之销毁，结果直接丢弃"""
+    try:
+        signal.emit(*args)
+    except RuntimeError:
+        pass
+
+
+class URLAnalysisSignals(QObject):
+    """URL分析任务的信号（QRunnable 不是 QObject，信号由此对象发出）"""
     
-    analysis_finished = Signal(list)  # List[URLInfo]
-    analysis_error = Signal(str)
+    analysis_finished = Signal(int, list)  # 批次号, List[URLInfo]
+    analysis_error = Signal(int, str)  # 批次号, 错误信息
+
+
+class URLAnalysisRunnable(QRunnable):
+    """URL分析任务，在全局线程池中执行"""
     
-    def __init__(self, file_upload_service, urls: List[str]):
+    def __init__(self, file_upload_service, urls: List[str], epoch: int, signals: URLAnalysisSignals):
         super().__init__()
         self.file_upload_service = file_upload_service
         self.urls = urls
+        self.epoch = epoch
+        self.signals = signals  # 由对话框持有，不随任务对象释放
     
     def run(self):
         try:
             url_infos = self.file_upload_service.analyze_urls(self.urls)
-            self.analysis_finished.emit(url_infos)
         except Exception as e:
-            self.analysis_error.emit(str(e))
+            _emit_result(self.signals.analysis_error, self.epoch, str(e))
+        else:
+            _emit_result(self.signals.analysis_finished, self.epoch, url_infos)
+
+
+class URLParseSignals(QObject):
+    """URL计数任务的信号"""
+    
+    parse_finished = Signal(int, int)  # 批次号, URL数量
+
+
+class URLParseRunnable(QRunnable):
+    """统计大段输入中的URL数量，在全局线程池中执行"""
+    
+    def __init__(self, text: str, epoch: int, signals: URLParseSignals):
+        super().__init__()
+        self.text = text
+        self.epoch = epoch
+        self.signals = signals  # 由对话框持有，不随任务对象释放
+    
+    def run(self):
+        _emit_result(self.signals.parse_finished, self.epoch, len(parse_urls_from_text(self.text)))
+
+
+class URLInfoModel(QAbstractListModel):
+    """URL预览列表模型，直接读取 URLInfo 列表，不为每行创建列表项对象"""
+    
+    URLInfoRole = Qt.ItemDataRole.UserRole + 1  # UserRole 返回URL字符串
+    
+    def __init__(self, format_item: Callable[[URLInfo], str], type_icon: Callable[[str], QIcon], parent=None):
+        super().__init__(parent)
+        self._infos: List[URLInfo] = []
+        self._display_texts: List[Optional[str]] = []  # 显示文本，首次读取时才格式化
+        self._format_item = format_item
+        self._type_icon = type_icon
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._infos)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._infos):
+            return None
+        row = index.row()
+        url_info = self._infos[row]
+        if role == Qt.ItemDataRole.DisplayRole:
+            text = self._display_texts[row]
+            if text is None:
+                text = self._display_texts[row] = self._format_item(url_info)
+            return text
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._type_icon(url_info.url_type)
+        if role == Qt.ItemDataRole.UserRole:
+            return url_info.url
+        if role == self.URLInfoRole:
+            return url_info
+        return None
+    
+    @property
+    def infos(self) -> List[URLInfo]:
+        """列表中的 URLInfo（只读，修改需经过模型方法）"""
+        return self._infos
+    
+    def set_infos(self, infos: List[URLInfo]):
+        """整体替换列表内容（直接引用传入的列表）"""
+        self.beginResetModel()
+        self._infos = infos
+        self._display_texts = [None] * len(infos)
+        self.endResetModel()
+    
+    def append_infos(self, infos: List[URLInfo]):
+        """在末尾追加 URLInfo"""
+        if not infos:
+            return
+        first = len(self._infos)
+        self.beginInsertRows(QModelIndex(), first, first + len(infos) - 1)
+        self._infos.extend(infos)
+        self._display_texts.extend([None] * len(infos))
+        self.endInsertRows()
+    
+    def remove_rows(self, rows: List[int]) -> List[URLInfo]:
+        """删除指定的行，连续的行一次删除，返回被删除的 URLInfo"""
+        removed = []
+        rows = sorted(set(rows), reverse=True)
+        while rows:
+            # 从后往前取出一段连续的行
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.beginRemoveRows(QModelIndex(), first, last)
+            removed.extend(self._infos[first:last + 1])
+            del self._infos[first:last + 1]
+            del self._display_texts[first:last + 1]
+            self.endRemoveRows()
+        return removed
 
 
 class URLCollectionDialog(QDialog):
@@ -41,11 +166,20 @@ class URLCollectionDialog(QDialog):
     
     urls_selected = Signal(list)  # List[str] - 选中的URL列表
     
+    # URL类型 -> 图标，所有对话框共用，首次创建对话框时生成
+    _TYPE_ICONS: Dict[str, QIcon] = {}
+    
     def __init__(self, file_upload_service, parent=None):
         super().__init__(parent)
+        self._ensure_icons()
         self.file_upload_service = file_upload_service
-        self.url_infos: List[URLInfo] = []
-        self.selected_urls: List[str] = []
+        self._total_size = 0  # url_infos 预估大小之和，随列表增删维护
+        self._selected_count = 0  # 选中的行数，按选择变化的增量维护
+        self._last_input_text: Optional[str] = None  # 上次统计时的输入内容
+        self._analysis_epoch = 0  # 分析批次号，只接受最近一次分析的结果
+        self._analysis_signals = URLAnalysisSignals(self)
+        self._parse_epoch = 0  # URL计数批次号，只显示最近一次输入的计数
+        self._parse_signals = URLParseSignals(self)
         
         self.setWindowTitle("URL 采集")
         self.setMinimumSize(600, 500)
@@ -104,7 +238,8 @@ class URLCollectionDialog(QDialog):
         layout = QVBoxLayout(group)
         
         # URL输入框
-        self.url_input = QTextEdit()
+        # 纯文本编辑器按需布局，粘贴大段URL时远快于 QTextEdit
+        self.url_input = QPlainTextEdit()
         self.url_input.setPlaceholderText(
             "请粘贴URL，例如：\n\n"
             "https://example.com/document.pdf\n"
@@ -147,9 +282,12 @@ class URLCollectionDialog(QDialog):
         group = QGroupBox("👀 URL 预览")
         layout = QVBoxLayout(group)
         
-        # URL列表
-        self.url_list = QListWidget()
-        self.url_list.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
+        # URL列表（url_infos 由模型持有）
+        self.url_model = URLInfoModel(self.format_url_item, self.get_type_icon, self)
+        self.url_list = QListView()
+        self.url_list.setModel(self.url_model)
+        self.url_list.setSelectionMode(QListView.SelectionMode.MultiSelection)
+        self.url_list.setLayoutMode(QListView.LayoutMode.Batched)
         layout.addWidget(self.url_list)
         
         # 预览操作
@@ -206,7 +344,10 @@ class URLCollectionDialog(QDialog):
         self.paste_btn.clicked.connect(self.paste_from_clipboard)
         
         # 预览相关
-        self.url_list.itemSelectionChanged.connect(self.on_selection_changed)
+        self.url_list.selectionModel().selectionChanged.connect(self._on_selection_delta)
+        # 删除行和清空列表时选择模型不会发出 selectionChanged，需单独处理
+        self.url_model.rowsAboutToBeRemoved.connect(self._on_rows_about_to_be_removed)
+        self.url_model.modelReset.connect(self._on_url_list_reset)
         self.select_all_btn.clicked.connect(self.select_all_urls)
         self.select_none_btn.clicked.connect(self.select_no_urls)
         self.remove_selected_btn.clicked.connect(self.remove_selected_urls)
@@ -218,115 +359,181 @@ class URLCollectionDialog(QDialog):
         self.auto_analyze_timer = QTimer()
         self.auto_analyze_timer.setSingleShot(True)
         self.auto_analyze_timer.timeout.connect(self.analyze_urls)
+        
+        # 分析任务结果（所有任务共用同一个信号对象）
+        self._analysis_signals.analysis_finished.connect(self.on_analysis_finished)
+        self._analysis_signals.analysis_error.connect(self.on_analysis_error)
+        self._parse_signals.parse_finished.connect(self._on_input_parsed)
+        
+        # URL计数防抖定时器，连续输入时只在停顿后解析一次
+        self._count_timer = QTimer(self)
+        self._count_timer.setSingleShot(True)
+        self._count_timer.setInterval(150)
+        self._count_timer.timeout.connect(self.update_input_stats)
     
     def on_input_changed(self):
         """输入内容变化时"""
+        self._count_timer.start()
+    
+    def update_input_stats(self):
+        """解析输入并更新URL计数，内容未变化时直接返回"""
         text = self.url_input.toPlainText().strip()
-        urls = parse_urls_from_text(text) if text else []
+        if text == self._last_input_text:
+            return
+        self._last_input_text = text
+        self._parse_epoch += 1
+        
+        # 大段输入交给线程池统计，结果返回前不自动分析
+        if len(text) > _BACKGROUND_PARSE_THRESHOLD:
+            self.auto_analyze_timer.stop()
+            QThreadPool.globalInstance().start(
+                URLParseRunnable(text, self._parse_epoch, self._parse_signals)
+            )
+            return
         
-        self.stats_label.setText(f"输入URL: {len(urls)}个")
+        self._show_input_count(len(parse_urls_from_text(text)) if text else 0)
+    
+    def _on_input_parsed(self, epoch: int, count: int):
+        """后台URL计数完成，输入已再次变化时丢弃结果"""
+        if epoch == self._parse_epoch:
+            self._show_input_count(count)
+    
+    def _show_input_count(self, count: int):
+        """显示输入的URL数量"""
+        self.stats_label.setText(f"输入URL: {count}个")
         
         # 重置自动分析定时器
         self.auto_analyze_timer.stop()
-        if urls:
+        if count:
             self.auto_analyze_timer.start(2000)  # 2秒后自动分析
     
     def analyze_urls(self):
         """分析URL"""
         text = self.url_input.toPlainText().strip()
         if not text:
-            self.url_list.clear()
-            self.url_infos.clear()
+            self._cancel_analysis()
+            self.url_model.set_infos([])
+            self._total_size = 0
             self.update_preview_stats()
             return
         
-        urls = parse_urls_from_text(text)
+        # 去掉重复的URL（保持顺序），大小写等差异由服务按规范化URL再去重
+        urls = list(dict.fromkeys(parse_urls_from_text(text)))
         if not urls:
             QMessageBox.information(self, "提示", "未识别到有效的URL")
             return
         
+        # 按服务去重时使用的规范化URL比较（主机名大小写、片段不同视为同一URL），
+        # 否则同一URL的另一种写法会在再次分析时被当作新增URL
+        wanted = {}
+        for url in filter(None, map(FileUploadService.normalize_url, urls)):
+            wanted.setdefault(self._url_key(url), url)
+        
+        # 移除已不在输入中的URL
+        stale_rows = [row for row, info in enumerate(self.url_infos) if self._url_key(info.url) not in wanted]
+        if stale_rows:
+            for url_info in self.url_model.remove_rows(stale_rows):
+                self._total_size -= url_info.estimated_size or 0
+            self.update_preview_stats()
+        
+        # 只分析新增的URL，已有的分析结果保留
+        analyzed = {self._url_key(info.url) for info in self.url_infos}
+        urls = [url for key, url in wanted.items() if key not in analyzed]
+        if not urls:
+            self._cancel_analysis()
+            return
+        
         # 显示进度
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)  # 不确定进度
         self.analyze_btn.setEnabled(False)
         
-        # 启动分析线程
-        self.analysis_worker = URLAnalysisWorker(self.file_upload_service, urls)
-        self.analysis_worker.analysis_finished.connect(self.on_analysis_finished)
-        self.analysis_worker.analysis_error.connect(self.on_analysis_error)
-        self.analysis_worker.start()
+        # 提交到全局线程池，之前尚未完成的分析结果将被丢弃
+        self._analysis_epoch += 1
+        runnable = URLAnalysisRunnable(
+            self.file_upload_service, urls, self._analysis_epoch, self._analysis_signals
+        )
+        QThreadPool.globalInstance().start(runnable)
     
-    def on_analysis_finished(self, url_infos: List[URLInfo]):
+    @staticmethod
+    def _url_key(url: str) -> str:
+        """URL的比较键，与服务端去重一致；无法解析的URL按原样比较"""
+        try:
+            return FileUploadService.canonicalize_url(url)
+        except ValueError:
+            return url
+    
+    def on_analysis_finished(self, epoch: int, url_infos: List[URLInfo]):
         """分析完成"""
-        self.url_infos = url_infos
-        self.update_url_list()
+        if epoch != self._analysis_epoch:
+            return
+        first = len(self.url_infos)
+        self.url_model.append_infos(url_infos)
+        self._total_size += sum(info.estimated_size or 0 for info in url_infos)
         self.update_preview_stats()
         
         # 隐藏进度
         self.progress_bar.setVisible(False)
         self.analyze_btn.setEnabled(True)
         
-        # 默认全选
-        self.select_all_urls()
+        # 新增的URL默认选中，已有URL的选择状态不变
+        if url_infos:
+            self.url_list.selectionModel().select(
+                QItemSelection(self.url_model.index(first), self.url_model.index(len(self.url_infos) - 1)),
+                QItemSelectionModel.SelectionFlag.Select
+            )
+    
+    @property
+    def url_infos(self) -> List[URLInfo]:
+        """已分析的URL信息（即列表模型中的数据）"""
+        return self.url_model.infos
     
-    def on_analysis_error(self, error: str):
+    def _cancel_analysis(self):
+        """丢弃进行中的分析结果并隐藏进度"""
+        self._analysis_epoch += 1
+        self.progress_bar.setVisible(False)
+        self.analyze_btn.setEnabled(True)
+    
+    def on_analysis_error(self, epoch: int, error: str):
         """分析出错"""
+        if epoch != self._analysis_epoch:
+            return
         self.progress_bar.setVisible(False)
         self.analyze_btn.setEnabled(True)
         QMessageBox.warning(self, "分析失败", f"URL分析失败：{error}")
     
-    def update_url_list(self):
-        """更新URL列表"""
-        self.url_list.clear()
-        
-        for url_info in self.url_infos:
-            item_text = self.format_url_item(url_info)
-            item = QListWidgetItem(item_text)
-            item.setData(Qt.ItemDataRole.UserRole, url_info.url)
-            
-            # 设置图标和样式
-            icon = self.get_type_icon(url_info.url_type)
-            item.setIcon(icon)
-            
-            self.url_list.addItem(item)
-    
     def format_url_item(self, url_info: URLInfo) -> str:
         """格式化URL列表项文本"""
-        type_name = {
-            'pdf': 'PDF文档',
-            'image': '图片',
-            'video': '视频',
-            'audio': '音频',
-            'youtube': 'YouTube',
-            'html': '网页'
-        }.get(url_info.url_type, '未知')
-        
-        # 基本信息
-        text = f"[{type_name}] {url_info.title or url_info.url}"
-        
-        # 添加大小信息
-        if url_info.estimated_size:
-            size_mb = url_info.estimated_size / 1024 / 1024
-            text += f" ({size_mb:.1f}MB)"
+        type_name = _TYPE_NAME_MAP.get(url_info.url_type, '未知')
         
-        # 添加MIME类型
-        if url_info.mime_type:
-            text += f"\n类型: {url_info.mime_type}"
+        # 大小信息
+        size_text = ""
+        if url_info.estimated_size:
+            size_mb = url_info.estimated_size * _MB_INV
+            size_text = f" ({size_mb:.1f}MB)"
         
-        text += f"\n地址: {url_info.url}"
+        # MIME类型
+        mime_text = f"\n类型: {url_info.mime_type}" if url_info.mime_type else ""
         
-        return text
+        return f"[{type_name}] {url_info.title or url_info.url}{size_text}{mime_text}\n地址: {url_info.url}"
+    
+    @classmethod
+    def _ensure_icons(cls):
+        """生成类型图标缓存（QIcon 需在 QApplication 创建后构造）"""
+        if cls._TYPE_ICONS:
+            return
+        # 这里可以添加实际的图标，现在使用空图标
+        for url_type in ('pdf', 'image', 'video', 'audio', 'youtube', 'html', 'default'):
+            cls._TYPE_ICONS[url_type] = QIcon()
     
     def get_type_icon(self, url_type: str) -> QIcon:
         """获取类型图标"""
-        # 这里可以添加实际的图标，现在返回空图标
-        return QIcon()
+        return self._TYPE_ICONS.get(url_type, self._TYPE_ICONS['default'])
     
     def update_preview_stats(self):
         """更新预览统计"""
         total_count = len(self.url_infos)
-        total_size = sum(info.estimated_size or 0 for info in self.url_infos)
-        size_mb = total_size / 1024 / 1024 if total_size > 0 else 0
+        size_mb = self._total_size * _MB_INV if self._total_size > 0 else 0
         
         self.preview_stats_label.setText(
             f"已识别: {total_count}个URL，预估大小: {size_mb:.1f}MB"
@@ -334,44 +541,72 @@ class URLCollectionDialog(QDialog):
     
     def clear_input(self):
         """清空输入"""
+        self._cancel_analysis()
         self.url_input.clear()
-        self.url_list.clear()
-        self.url_infos.clear()
+        self.url_model.set_infos([])
+        self._total_size = 0
         self.update_preview_stats()
     
     def paste_from_clipboard(self):
         """从剪贴板粘贴"""
         from PySide6.QtWidgets import QApplication
-        clipboard = QApplication.clipboard()
-        text = clipboard.text()
+        # 剪贴板只能在GUI线程读取；非文本内容（如图片）直接跳过，不做转换
+        mime_data = QApplication.clipboard().mimeData()
+        if mime_data is None or not mime_data.hasText():
+            return
+        text = mime_data.text()
         if text:
-            current_text = self.url_input.toPlainText()
-            if current_text:
-                self.url_input.append(text)
-            else:
-                self.url_input.setPlainText(text)
+            # 在文档末尾一次编辑块内插入，只触发一次重新布局
+            cursor = QTextCursor(self.url_input.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.beginEditBlock()
+            if not self.url_input.document().isEmpty():
+                cursor.insertText('\n')
+            cursor.insertText(text)
+            cursor.endEditBlock()
+            self.url_input.setTextCursor(cursor)
+    
+    @property
+    def selected_urls(self) -> List[str]:
+        """选中的URL列表（按列表顺序，读取时才从选择模型生成）"""
+        rows = sorted(index.row() for index in self.url_list.selectionModel().selectedRows())
+        return [self.url_infos[row].url for row in rows]
+    
+    def _on_selection_delta(self, selected, deselected):
+        """按本次选择变化的行范围更新选中行数，不逐项读取数据"""
+        self._selected_count += sum(r.height() for r in selected) - sum(r.height() for r in deselected)
+        self.on_selection_changed()
+    
+    def _on_rows_about_to_be_removed(self, parent, first: int, last: int):
+        """删除行前减去其中已选中的行"""
+        selection_model = self.url_list.selectionModel()
+        self._selected_count -= sum(
+            1 for row in range(first, last + 1) if selection_model.isRowSelected(row, parent)
+        )
+        self.on_selection_changed()
+    
+    def _on_url_list_reset(self):
+        """列表重置时清空选择状态"""
+        self._selected_count = 0
+        self.on_selection_changed()
     
     def on_selection_changed(self):
         """选择变化时"""
-        selected_items = self.url_list.selectedItems()
-        self.selected_urls = [item.data(Qt.ItemDataRole.UserRole) for item in selected_items]
-        
         # 更新按钮状态
-        has_selection = len(self.selected_urls) > 0
+        has_selection = self._selected_count > 0
         self.ok_btn.setEnabled(has_selection)
         self.remove_selected_btn.setEnabled(has_selection)
         
         # 更新确定按钮文本
         if has_selection:
-            self.ok_btn.setText(f"确定使用选中的 {len(self.selected_urls)} 个URL")
+            self.ok_btn.setText(f"确定使用选中的 {self._selected_count} 个URL")
         else:
             self.ok_btn.setText("确定使用选中的URL")
     
     def select_all_urls(self):
         """全选URL"""
-        for i in range(self.url_list.count()):
-            item = self.url_list.item(i)
-            item.setSelected(True)
+        # 原生全选只发出一次选择变化信号
+        self.url_list.selectAll()
     
     def select_no_urls(self):
         """全不选URL"""
@@ -379,22 +614,19 @@ class URLCollectionDialog(QDialog):
     
     def remove_selected_urls(self):
         """删除选中的URL"""
-        selected_items = self.url_list.selectedItems()
-        if not selected_items:
+        selected_rows = [index.row() for index in self.url_list.selectionModel().selectedIndexes()]
+        if not selected_rows:
             return
         
-        # 从后往前删除，避免索引问题
-        for item in reversed(selected_items):
-            row = self.url_list.row(item)
-            self.url_list.takeItem(row)
-            if 0 <= row < len(self.url_infos):
-                self.url_infos.pop(row)
+        # 模型直接在 self.url_infos 上删除，连续的行一次删除
+        for url_info in self.url_model.remove_rows(selected_rows):
+            self._total_size -= url_info.estimated_size or 0
         
         self.update_preview_stats()
     
     def accept_selected_urls(self):
         """接受选中的URL"""
-        if not self.selected_urls:
+        if not self._selected_count:
             QMessageBox.information(self, "提示", "请选择要使用的URL")
             return
         
@@ -6,6 +6,9 @@
 import os
 import sys
 import asyncio
+import time
+import concurrent.futures
+from collections import Counter
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Callable
 from datetime import datetime
@@ -16,7 +19,7 @@ from PySide6.QtWidgets import (
     QFrame, QFileDialog, QToolButton, QMenu, QTextEdit,
     QSplitter, QGroupBox, QScrollArea, QTabWidget
 )
-from PySide6.QtCore import Qt, Signal, QThread, QMimeData, QUrl, QTimer
+from PySide6.QtCore import Qt, Signal, QObject, QMimeData, QUrl, QTimer
 from PySide6.QtGui import QDragEnterEvent, QDropEvent, QPixmap, QPainter, QPen, QBrush, QColor, QFont
 
 # 添加项目根目录到路径
@@ -24,35 +27,67 @@ current_dir = Path(__file__).parent.parent
 sys.path.append(str(current_dir))
 
 from services.file_upload_service import get_file_upload_service, ProcessedFile, parse_urls_from_text
+from geminichat.domain.attachment import AttachmentType
+from ui.async_runner import get_async_runner
 from ui.dialogs.url_collection_dialog import URLCollectionDialog
 
 
-class FileProcessingWorker(QThread):
-    """文件处理工作线程"""
+# 支持上传的文件扩展名（小写，含点）
+_SUPPORTED_EXTS = frozenset({
+    '.pdf', '.txt', '.md', '.html', '.xml',  # 文档
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.heic', '.heif',  # 图片
+    '.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.wmv', '.3gpp',  # 视频
+    '.mp3', '.wav', '.aac', '.ogg', '.flac', '.aiff'  # 音频
+})
+
+# 文件选择对话框的过滤器，与 _SUPPORTED_EXTS 同源，避免两处列表不一致
+_FILE_DIALOG_FILTER = (
+    "所有支持的文件 (" + " ".join(f"*{ext}" for ext in sorted(_SUPPORTED_EXTS)) + ");;"
+    "所有文件 (*.*)"
+)
+
+# 文件类型图标（按枚举成员索引，未列出的类型使用 📎）
+TYPE_ICONS = {
+    AttachmentType.DOCUMENT: '📄',
+    AttachmentType.IMAGE: '🖼️',
+    AttachmentType.VIDEO: '🎥',
+    AttachmentType.AUDIO: '🎵',
+    AttachmentType.CODE: '💻',
+    AttachmentType.OTHER: '📎'
+}
+
+
+class FileProcessingWorker(QObject):
+    """文件处理任务，在共享的事件循环线程中执行
+    
+    信号从事件循环线程发射，经队列连接回到UI线程
+    """
     
     processing_progress = Signal(str, int)  # filename, progress
     processing_finished = Signal(list)  # List[ProcessedFile]
     processing_error = Signal(str)
     
+    # 进度信号的最短发射间隔（秒），约30Hz，避免大批量文件时跨线程信号挤满事件队列
+    PROGRESS_EMIT_INTERVAL = 1 / 30
+    
     def __init__(self, file_upload_service, file_paths: Optional[List[str]] = None, urls: Optional[List[str]] = None):
         super().__init__()
         self.file_upload_service = file_upload_service
         self.file_paths = file_paths or []
         self.urls = urls or []
+        
+        self._future: Optional[concurrent.futures.Future] = None
+        self._last_progress_emit = float('-inf')
+    
+    def start(self):
+        """把任务投递到共享的事件循环线程"""
+        self._future = get_async_runner().submit(self._run())
     
-    def run(self):
+    async def _run(self):
         """执行文件处理"""
         try:
-            # 异步处理文件和URL
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                processed_files = loop.run_until_complete(self._process_all())
-                self.processing_finished.emit(processed_files)
-            finally:
-                loop.close()
-                
+            processed_files = await self._process_all()
+            self.processing_finished.emit(processed_files)
         except Exception as e:
             print(f"FileProcessingWorker异常: {e}")
             import traceback
@@ -60,23 +95,26 @@ class FileProcessingWorker(QThread):
             self.processing_error.emit(str(e))
     
     async def _process_all(self):
-        """处理所有文件和URL"""
-        processed_files = []
-        
-        # 处理文件
+        """处理所有文件和URL（文件与URL同时处理）"""
         if self.file_paths:
             for i, file_path in enumerate(self.file_paths):
-                self.processing_progress.emit(file_path, int(50 * i / len(self.file_paths)))
-            
-            file_results = await self.file_upload_service.process_files(self.file_paths)
-            processed_files.extend(file_results)
+                self._emit_progress(file_path, int(50 * i / len(self.file_paths)))
         
-        # 处理URL
-        if self.urls:
-            url_results = await self.file_upload_service.process_urls(self.urls)
-            processed_files.extend(url_results)
+        file_results, url_results = await asyncio.gather(
+            self.file_upload_service.process_files(self.file_paths),
+            self.file_upload_service.process_urls(self.urls)
+        )
         
-        return processed_files
+        # 文件在前、URL在后，与分开处理时的顺序一致
+        return file_results + url_results
+    
+    def _emit_progress(self, filename: str, progress: int):
+        """发射进度信号，距上次发射不足 PROGRESS_EMIT_INTERVAL 时丢弃本次更新"""
+        now = time.monotonic()
+        if now - self._last_progress_emit < self.PROGRESS_EMIT_INTERVAL:
+            return
+        self._last_progress_emit = now
+        self.processing_progress.emit(filename, progress)
 
 
 class FilePreviewItem(QListWidgetItem):
@@ -92,13 +130,7 @@ class FilePreviewItem(QListWidgetItem):
         file = self.processed_file
         
         # 格式化显示文本
-        type_icon = {
-            'IMAGE': '🖼️',
-            'DOCUMENT': '📄',
-            'VIDEO': '🎥',
-            'AUDIO': '🎵',
-            'OTHER': '📎'
-        }.get(file.attachment_type.value, '📎')
+        type_icon = TYPE_ICONS.get(file.attachment_type, '📎')
         
         # 文件大小
         size_text = self._format_file_size(file.file_size)
@@ -147,6 +179,9 @@ class EnhancedFileUploadWidget(QWidget):
         # 状态管理
         self.processed_files: List[ProcessedFile] = []
         self.is_processing = False
+        # 随增删增量维护的统计，避免每次刷新都遍历全部文件
+        self._total_size: int = 0
+        self._type_counts: Counter = Counter()
         
         # UI组件
         self.setup_ui()
@@ -401,36 +436,36 @@ class EnhancedFileUploadWidget(QWidget):
         event.acceptProposedAction()
     
     def scan_folder(self, folder_path: Path, max_depth: int = 3) -> List[str]:
-        """扫描文件夹，递归获取文件"""
+        """扫描文件夹，递归获取文件
+        
+        使用 os.scandir 遍历，目录项自带文件类型信息，无需为每个条目额外 stat
+        """
         files = []
-        try:
-            def _scan_recursive(path: Path, current_depth: int = 0):
-                if current_depth >= max_depth:
-                    return
-                
-                for item in path.iterdir():
-                    if item.is_file():
-                        # 检查是否为支持的格式
-                        if self.is_supported_file(str(item)):
-                            files.append(str(item))
-                    elif item.is_dir() and not item.name.startswith('.'):
-                        _scan_recursive(item, current_depth + 1)
+        stack = [(os.fspath(folder_path), 0)]
+        while stack:
+            path, depth = stack.pop()
+            if depth >= max_depth:
+                continue
             
-            _scan_recursive(folder_path)
-        except Exception as e:
-            print(f"扫描文件夹失败: {e}")
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_file():
+                            # 检查是否为支持的格式
+                            if os.path.splitext(entry.name)[1].lower() in _SUPPORTED_EXTS:
+                                files.append(entry.path)
+                        elif entry.is_dir() and not entry.name.startswith('.'):
+                            stack.append((entry.path, depth + 1))
+            except OSError as e:
+                print(f"扫描文件夹失败: {e}")
         
         return files
     
-    def is_supported_file(self, file_path: str) -> bool:
-        """检查是否为支持的文件类型"""
-        from services.file_upload_service import FileUploadService
-        return Path(file_path).suffix.lower() in [
-            '.pdf', '.txt', '.md', '.html', '.xml',  # 文档
-            '.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.heic', '.heif',  # 图片
-            '.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.wmv', '.3gpp',  # 视频
-            '.mp3', '.wav', '.aac', '.ogg', '.flac', '.aiff'  # 音频
-        ]
+    def is_supported_file(self, file_path) -> bool:
+        """检查是否为支持的文件类型（接受路径字符串或 Path）"""
+        if not isinstance(file_path, Path):
+            file_path = Path(file_path)
+        return file_path.suffix.lower() in _SUPPORTED_EXTS
     
     def select_files(self):
         """选择文件"""
@@ -438,7 +473,7 @@ class EnhancedFileUploadWidget(QWidget):
             self,
             "选择文件",
             "",
-            "所有支持的文件 (*.pdf *.txt *.md *.html *.jpg *.jpeg *.png *.gif *.webp *.mp4 *.avi *.mov *.mp3 *.wav *.aac);;""所有文件 (*.*)"
+            _FILE_DIALOG_FILTER
         )
         
         if file_paths:
@@ -506,7 +541,10 @@ class EnhancedFileUploadWidget(QWidget):
     def on_processing_finished(self, processed_files: List[ProcessedFile]):
         """处理完成"""
         self.processed_files.extend(processed_files)
-        self.update_file_list()
+        for f in processed_files:
+            self._total_size += f.file_size
+            self._type_counts[f.attachment_type] += 1
+        self._append_file_items(processed_files)
         self.update_file_stats()
         
         self.is_processing = False
@@ -544,39 +582,34 @@ class EnhancedFileUploadWidget(QWidget):
             self.processing_status_changed.emit("就绪")
     
     def update_file_list(self):
-        """更新文件列表"""
+        """重建文件列表"""
         self.file_list.clear()
+        self._append_file_items(self.processed_files)
+    
+    def _append_file_items(self, processed_files: List[ProcessedFile]):
+        """在列表末尾追加文件项，追加期间暂停重绘，只触发一次布局和绘制"""
+        if not processed_files:
+            return
         
-        for processed_file in self.processed_files:
-            item = FilePreviewItem(processed_file)
-            self.file_list.addItem(item)
+        self.file_list.setUpdatesEnabled(False)
+        try:
+            for processed_file in processed_files:
+                self.file_list.addItem(FilePreviewItem(processed_file))
+        finally:
+            self.file_list.setUpdatesEnabled(True)
     
     def update_file_stats(self):
         """更新文件统计"""
         total_count = len(self.processed_files)
-        total_size = sum(f.file_size for f in self.processed_files)
-        size_mb = total_size / 1024 / 1024 if total_size > 0 else 0
+        size_mb = self._total_size / 1024 / 1024 if self._total_size > 0 else 0
         
         self.file_stats.setText(f"文件: {total_count}个, 大小: {size_mb:.1f}MB")
         
         # 更新快速统计
-        type_counts = {}
-        for f in self.processed_files:
-            type_name = f.attachment_type.value
-            type_counts[type_name] = type_counts.get(type_name, 0) + 1
-        
-        type_icons = {
-            'DOCUMENT': '📄',
-            'IMAGE': '🖼️', 
-            'VIDEO': '🎥',
-            'AUDIO': '🎵',
-            'OTHER': '📎'
-        }
-        
-        stats_text = []
-        for type_name, count in type_counts.items():
-            icon = type_icons.get(type_name, '📎')
-            stats_text.append(f"{icon}{count}")
+        stats_text = [
+            f"{TYPE_ICONS.get(attachment_type, '📎')}{count}"
+            for attachment_type, count in self._type_counts.items()
+        ]
         
         if stats_text:
             self.quick_stats.setText(" | ".join(stats_text))
@@ -617,7 +650,11 @@ class EnhancedFileUploadWidget(QWidget):
                 row = self.file_list.row(item)
                 self.file_list.takeItem(row)
                 if 0 <= row < len(self.processed_files):
-                    self.processed_files.pop(row)
+                    removed = self.processed_files.pop(row)
+                    self._total_size -= removed.file_size
+                    self._type_counts[removed.attachment_type] -= 1
+                    if self._type_counts[removed.attachment_type] <= 0:
+                        del self._type_counts[removed.attachment_type]
             
             self.update_file_stats()
             self.files_processed.emit(self.processed_files)
@@ -636,6 +673,8 @@ class EnhancedFileUploadWidget(QWidget):
         
         if reply == QMessageBox.StandardButton.Yes:
             self.processed_files.clear()
+            self._total_size = 0
+            self._type_counts.clear()
             self.file_list.clear()
             self.update_file_stats()
             self.status_label.setText("已清空")
@@ -1325,6 +1325,8 @@ class EnhancedMainWindow(QMainWindow):
         # 如果有持久化管理器，处理会话关闭的持久化策略
         if self.persistency_manager and conversation:
             self.persistency_manager.handle_chat_close(conversation)
+            if self.startup_manager and not getattr(conversation, 'is_ephemeral', True):
+                self.startup_manager.record_last_active_chat(conversation.id)
         
         # 执行标签页关闭逻辑
         if self.tab_widget.count() > 1:  # 至少保留一个标签页
@@ -1847,6 +1849,7 @@ class EnhancedMainWindow(QMainWindow):
         conversation = self.startup_manager.load_existing_chat(chat_id)
         if conversation:
             self.add_tab_with_conversation(conversation)
+            self.startup_manager.record_last_active_chat(chat_id)
             # 更新状态
             from geminichat.domain.app_state import AppStateType, AppState
             self.current_app_state = AppState(AppStateType.CHAT_VIEW, current_chat_id=chat_id)
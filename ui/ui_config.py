@@ -6,17 +6,19 @@ from enum import Enum
 from uuid import uuid4
 from datetime import datetime
 
+from geminichat.infrastructure.history_repo import HistoryRepository
+
 # 配置常量
 HISTORY_DIR = Path.home() / ".gemini_chat" / "history"
 BASE_DIR = Path(__file__).parent.parent
 
 # 需要跳过的特殊文件
-SKIP_FILES = {'folders.json'}
+SKIP_FILES = HistoryRepository.SKIP_FILES
 
 
 def is_conversation_file(file_path: Path) -> bool:
     """判断是否为有效的对话文件"""
-    return file_path.suffix == '.json' and file_path.name not in SKIP_FILES
+    return HistoryRepository.is_conversation_name(file_path.name)
 
 # 字体配置工具函数
 def get_safe_font(size=10, bold=False):